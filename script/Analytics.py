@@ -0,0 +1,185 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+from DataSource import ACCOUNT_COLUMNS, filter_accounts, filter_narrations
+
+# Recurring payment periods: name -> (expected interval in days, tolerance in days)
+RECURRING_PERIODS = {
+    'Weekly': (7, 2),
+    'Monthly': (30, 4),
+    'Quarterly': (91, 10),
+    'Yearly': (365, 20),
+}
+
+# A narration is recurring once it has been debited this many times at a steady interval and amount
+MIN_RECURRING_OCCURRENCES = 3
+MAX_RECURRING_AMOUNT_VARIATION = 0.15  # Typical deviation of the amount relative to its median
+
+# A debit is a spike when it stands well above the previous debits for the same narration
+SPIKE_WINDOW = 12  # Number of previous debits used as the baseline
+SPIKE_MIN_HISTORY = 3  # Baseline debits required before a spike can be flagged
+SPIKE_Z_SCORE = 3.0  # Standard deviations above the baseline mean
+SPIKE_MIN_RATIO = 2.0  # And at least this many times the baseline mean
+
+# Columns kept from each debit; everything else in the transaction frame is ignored
+HISTORY_COLUMNS = ['Date', 'Narration', 'Generalized Narration', 'Debit Amount', 'Chq/Ref Number']
+
+
+def group_keys(df: pd.DataFrame) -> List[str]:
+    """Return the columns identifying a payee: the generalized narration, per bank/account when present."""
+    return [column for column in ACCOUNT_COLUMNS if column in df.columns] + ['Generalized Narration']
+
+
+def detect_recurring(debits: pd.DataFrame) -> pd.DataFrame:
+    """Find payees debited at a steady interval and amount (EMIs, subscriptions, SIPs)."""
+    keys = group_keys(debits)
+    work = debits.sort_values(keys + ['Date'], kind='stable')
+    grouped = work.groupby(keys, observed=True, sort=False)
+    work = work.assign(Interval=grouped['Date'].diff().dt.days)
+
+    # Median absolute deviations keep a single late payment or one-off top-up from hiding a pattern
+    grouped = work.groupby(keys, observed=True, sort=False)
+    median_amount = grouped['Debit Amount'].transform('median')
+    work['IntervalDeviation'] = (work['Interval'] - grouped['Interval'].transform('median')).abs()
+    work['AmountDeviation'] = (work['Debit Amount'] - median_amount).abs() / median_amount
+
+    stats = work.groupby(keys, observed=True).agg(
+        Occurrences=('Debit Amount', 'size'),
+        MedianInterval=('Interval', 'median'),
+        IntervalSpread=('IntervalDeviation', 'median'),
+        AmountSpread=('AmountDeviation', 'median'),
+        TypicalAmount=('Debit Amount', 'median'),
+        LastDate=('Date', 'max'),
+    )
+
+    # Classify the median interval against each known period in one vectorized pass
+    conditions = [
+        ((stats['MedianInterval'] - expected).abs() <= tolerance) & (stats['IntervalSpread'] <= tolerance)
+        for expected, tolerance in RECURRING_PERIODS.values()
+    ]
+    stats['Period'] = np.select(conditions, list(RECURRING_PERIODS.keys()), default='')
+
+    recurring = stats[
+        (stats['Period'] != '') &
+        (stats['Occurrences'] >= MIN_RECURRING_OCCURRENCES) &
+        (stats['AmountSpread'] <= MAX_RECURRING_AMOUNT_VARIATION)
+    ]
+
+    result = recurring.reset_index()[keys + ['Period', 'Occurrences', 'TypicalAmount', 'LastDate']]
+    result['TypicalAmount'] = result['TypicalAmount'].round().astype('int64')
+    result['NextExpected'] = result['LastDate'] + pd.to_timedelta(
+        recurring['MedianInterval'].to_numpy(), unit='D')
+    return result.rename(columns={'TypicalAmount': 'Typical Amount', 'LastDate': 'Last Date',
+                                  'NextExpected': 'Next Expected'})
+
+
+def detect_spikes(debits: pd.DataFrame) -> pd.DataFrame:
+    """Flag debits far above the rolling baseline of previous debits for the same payee."""
+    keys = group_keys(debits)
+    work = debits.sort_values(keys + ['Date'], kind='stable')
+    amounts = work['Debit Amount'].astype('float64')
+
+    # closed='left' keeps the current debit out of its own baseline
+    baseline = (amounts.groupby([work[key] for key in keys], observed=True, sort=False)
+                .rolling(SPIKE_WINDOW, min_periods=SPIKE_MIN_HISTORY, closed='left')
+                .agg(['mean', 'std'])
+                .droplevel(list(range(len(keys))))
+                .reindex(work.index))
+
+    z_score = (amounts - baseline['mean']) / baseline['std'].replace(0, np.nan)
+    is_spike = (
+        baseline['mean'].notna() &
+        (amounts >= SPIKE_MIN_RATIO * baseline['mean']) &
+        ((z_score >= SPIKE_Z_SCORE) | baseline['std'].eq(0))
+    )
+
+    spikes = work[is_spike].copy()
+    spikes['Baseline'] = baseline.loc[is_spike, 'mean'].round().astype('int64')
+    spikes['Z Score'] = z_score[is_spike].round(1)
+    return spikes
+
+
+class AnomalyEngine:
+    """Keep recurring-payment and spike results up to date as new days of transactions arrive.
+
+    The engine keeps its own compact history of debits. Each `update` only looks at days after the
+    last processed date: spikes are evaluated for the new debits alone, against the tail of each
+    payee's history, and recurring payments are recomputed only for payees seen in the new days.
+    Updates are serialized by `lock`, so concurrent dashboard callbacks never add the same days twice.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.history = None
+        self.last_date = None
+        self.recurring = pd.DataFrame()
+        self.spikes = pd.DataFrame()
+
+    def update(self, transactions: pd.DataFrame) -> int:
+        """Analyse transactions dated after the last processed date and return the number of new debits."""
+        with self.lock:
+            new_debits = transactions[transactions['Debit Amount'] > 0]
+            if self.last_date is not None:
+                new_debits = new_debits[new_debits['Date'] > self.last_date]
+            return self._add(new_debits)
+
+    def add_account(self, transactions: pd.DataFrame) -> int:
+        """Analyse the whole history of an account not seen before, whatever its dates.
+
+        The consolidated view loads accounts one at a time. Payees are keyed by bank and account, so the new
+        debits never share a baseline with those already analysed.
+        """
+        with self.lock:
+            return self._add(transactions[transactions['Debit Amount'] > 0])
+
+    def _add(self, new_debits: pd.DataFrame) -> int:
+        new_debits = new_debits[[column for column in new_debits.columns
+                                 if column in HISTORY_COLUMNS or column in ACCOUNT_COLUMNS]]
+        if new_debits.empty:
+            return 0
+
+        if self.history is None:
+            self._analyse_all(new_debits)
+        else:
+            self._analyse_new(new_debits)
+
+        self.last_date = self.history['Date'].max()
+        return len(new_debits)
+
+    def _analyse_all(self, debits: pd.DataFrame):
+        self.history = debits.reset_index(drop=True)
+        self.spikes = detect_spikes(self.history)
+        self.recurring = detect_recurring(self.history)
+
+    def _analyse_new(self, new_debits: pd.DataFrame):
+        keys = group_keys(new_debits)
+        previous = self.history
+        self.history = pd.concat([previous, new_debits], ignore_index=True)
+        new_index = self.history.index[len(previous):]
+
+        # Only payees seen in the new days need their baselines and recurring stats refreshed
+        touched = pd.MultiIndex.from_frame(new_debits[keys].astype(object)).unique()
+        in_touched = pd.MultiIndex.from_frame(self.history[keys].astype(object)).isin(touched)
+        touched_history = self.history[in_touched]
+
+        # Spike baselines need at most SPIKE_WINDOW previous debits per payee
+        baseline_rows = touched_history.drop(new_index).groupby(keys, observed=True).tail(SPIKE_WINDOW)
+        candidates = pd.concat([baseline_rows, self.history.loc[new_index]])
+        new_spikes = detect_spikes(candidates)
+        self.spikes = pd.concat([self.spikes, new_spikes[new_spikes.index.isin(new_index)]])
+
+        recurring_touched = detect_recurring(touched_history)
+        if not self.recurring.empty:
+            unchanged = ~pd.MultiIndex.from_frame(self.recurring[keys].astype(object)).isin(touched)
+            recurring_touched = pd.concat([self.recurring[unchanged], recurring_touched], ignore_index=True)
+        self.recurring = recurring_touched
+
+    def spikes_between(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                       narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+                       accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        """Return the spikes in a date range, filtered by generalized narration and account like the dashboard."""
+        if self.spikes.empty:
+            return self.spikes
+        spikes = self.spikes[(self.spikes['Date'] >= start_date) & (self.spikes['Date'] <= end_date)]
+        return filter_narrations(filter_accounts(spikes, accounts), narrations, filter_mode)
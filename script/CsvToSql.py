@@ -1,7 +1,10 @@
 import os
 import pandas as pd
-import mysql.connector
-from typing import List
+from DbSchema import prepare_table
+from DbPool import BatchWriter, COMMIT_PER_FILES, COMMIT_PER_RUN, get_pool
+from Reconciliation import check_file, forget_file, print_ingest_report
+from TransactionModel import COLUMN_MAPPINGS, get_generalized_narration
+from typing import List, Optional
 from datetime import datetime
 
 # Database connection details for localhost MySQL
@@ -14,30 +17,12 @@ DB_PASSWORD = 'mysql'  # Replace with your password
 # Define the SQL table name
 TABLE_NAME = 'bank_statement_replica'
 
-# Column mapping configuration for different banks
-COLUMN_MAPPINGS = {
-    'HDFC': {
-        'date': 'Date',
-        'narration': 'Narration',
-        'chq_ref_number': 'Chq/Ref Number',
-        'credit_amount': 'Credit Amount',
-        'debit_amount': 'Debit Amount',
-        'closing_balance': 'Closing Balance'
-    },
-    # Add mappings for other banks as needed
-    'ICICI': {
-        'date': 'Transaction Date',
-        'narration': 'Description',
-        'chq_ref_number': 'Reference Number',
-        'credit_amount': 'Credit',
-        'debit_amount': 'Debit',
-        'closing_balance': 'Balance'
-    }
-}
-
 # Define default bank name
 DEFAULT_BANK_NAME = 'HDFC'
 
+# Skip files whose closing balances do not reconcile instead of writing them to MySQL
+REJECT_UNRECONCILED_FILES = True
+
 # Define default column names if not present in the file
 DEFAULT_COLUMN_NAMES = [
     'Date',
@@ -51,23 +36,24 @@ DEFAULT_COLUMN_NAMES = [
 
 
 def get_db_connection():
-    """Establish a database connection to MySQL."""
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    """Borrow a MySQL connection from the shared connection pool."""
+    return get_pool({
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'database': DB_NAME,
+        'user': DB_USER,
+        'password': DB_PASSWORD
+    }).get_connection()
 
 
 def insert_data(cursor, data: List[tuple]):
     """Insert data into the MySQL table."""
     insert_query = f"""
         INSERT INTO {TABLE_NAME} 
-        (date, narration, chq_ref_number, credit_amount, debit_amount, closing_balance, bank_name) 
+        (date, narration, chq_ref_number, credit_amount, debit_amount, closing_balance, bank_name,
+         generalized_narration) 
         VALUES 
-        (%s, %s, %s, %s, %s, %s, %s)
+        (%s, %s, %s, %s, %s, %s, %s, %s)
     """
     cursor.executemany(insert_query, data)
 
@@ -89,96 +75,132 @@ def clean_data(value: str) -> str:
     return value
 
 
-def process_file(file_path: str, bank_name: str, cursor):
-    """Process a single file and insert data into the MySQL table."""
-    # Retrieve the column mapping for the specified bank
-    column_mapping = COLUMN_MAPPINGS.get(bank_name, COLUMN_MAPPINGS[DEFAULT_BANK_NAME])
+def process_file(file_path: str, bank_name: str, cursor, file_summaries: Optional[dict] = None,
+                 seen_keys: Optional[dict] = None) -> int:
+    """Process a single file, insert data into the MySQL table and return the number of rows inserted.
 
-    # Read the file and map the columns accordingly
+    Rows already read from another file of the run (see Reconciliation.check_file) are not inserted again.
+    """
     try:
-        # Read the .txt or .csv file, skipping the first row as it contains headers
-        df = pd.read_csv(file_path, delimiter=',', skiprows=1, names=DEFAULT_COLUMN_NAMES, skipinitialspace=True)
-
-        # Clean and format data
-        df = df.map(clean_data)
-
-        # Convert date column to correct format
-        df['Date'] = df['Date'].apply(format_date)
-
-        # Convert numeric columns to float for database compatibility
-        df['Credit Amount'] = pd.to_numeric(df['Credit Amount'], errors='coerce').fillna(0.0)
-        df['Debit Amount'] = pd.to_numeric(df['Debit Amount'], errors='coerce').fillna(0.0)
-        df['Closing Balance'] = pd.to_numeric(df['Closing Balance'], errors='coerce').fillna(0.0)
-
-        # Filter and rename columns based on mapping
-        mapped_columns = {db_column: df_column for db_column, df_column in column_mapping.items() if
-                          df_column in df.columns}
-        filtered_df = df[list(mapped_columns.values())].rename(columns={v: k for k, v in mapped_columns.items()})
-
-        # Adding bank_name column with the bank name value
-        filtered_df['bank_name'] = bank_name
-
-        # Debugging: Print filtered DataFrame structure
-        print(f"Filtered DataFrame for {file_path}:\n", filtered_df.head())
-
-        # Convert DataFrame to list of tuples for batch insertion
-        data = [
-            (
-                row['date'],
-                row['narration'],
-                row['chq_ref_number'],
-                row['credit_amount'],
-                row['debit_amount'],
-                row['closing_balance'],
-                row['bank_name']
-            )
-            for _, row in filtered_df.iterrows()
-        ]
-
-        # Debugging: Print data to be inserted
-        print(f"Data to be inserted for {file_path}:\n", data[:5])
-
-        # Insert data into the database
-        insert_data(cursor, data)
-        print(f"Data from {file_path} inserted successfully for {bank_name}.")
-    except Exception as e:
-        print(f"Error processing file {file_path} for bank {bank_name}: {e}")
+        return insert_file(file_path, bank_name, cursor, file_summaries, seen_keys)
+    except Exception:
+        # The file is rolled back, so its rows must not count as already written
+        if seen_keys is not None:
+            forget_file(seen_keys, file_path)
+        raise
 
 
-def process_files(directory: str, bank_name: str = DEFAULT_BANK_NAME, insert: bool = True):
-    """Process all files in a directory for a specified bank."""
-    # Establish a database connection
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def insert_file(file_path: str, bank_name: str, cursor, file_summaries: Optional[dict] = None,
+                seen_keys: Optional[dict] = None) -> int:
+    """Parse one file and insert its new rows; called through process_file."""
+    # Retrieve the column mapping for the specified bank
+    column_mapping = COLUMN_MAPPINGS.get(bank_name, COLUMN_MAPPINGS[DEFAULT_BANK_NAME])
 
+    # Read the .txt or .csv file, skipping the first row as it contains headers
+    df = pd.read_csv(file_path, delimiter=',', skiprows=1, names=DEFAULT_COLUMN_NAMES, skipinitialspace=True)
+
+    # Clean and format data
+    df = df.map(clean_data)
+
+    # Convert date column to correct format
+    df['Date'] = df['Date'].apply(format_date)
+
+    # Convert numeric columns to float for database compatibility
+    df['Credit Amount'] = pd.to_numeric(df['Credit Amount'], errors='coerce').fillna(0.0)
+    df['Debit Amount'] = pd.to_numeric(df['Debit Amount'], errors='coerce').fillna(0.0)
+    df['Closing Balance'] = pd.to_numeric(df['Closing Balance'], errors='coerce').fillna(0.0)
+
+    # Reconcile the closing balance chain so bad parses never reach MySQL
+    summary, repeated = check_file(df, file_path, strict=REJECT_UNRECONCILED_FILES, seen_keys=seen_keys)
+    if file_summaries is not None:
+        file_summaries[file_path] = summary.assign(Bank=bank_name)
+
+    # Overlapping statements repeat rows that an earlier file of the run already wrote
+    if repeated.any():
+        print(f"Skipping {int(repeated.sum())} row(s) of {file_path} already read from another statement file.")
+        df = df[~repeated]
+
+    # Filter and rename columns based on mapping
+    mapped_columns = {db_column: df_column for db_column, df_column in column_mapping.items() if
+                      df_column in df.columns}
+    filtered_df = df[list(mapped_columns.values())].rename(columns={v: k for k, v in mapped_columns.items()})
+
+    # Adding bank_name column with the bank name value
+    filtered_df['bank_name'] = bank_name
+
+    # Generalized narration lets the dashboard push narration filters down to MySQL
+    filtered_df['generalized_narration'] = filtered_df['narration'].map(get_generalized_narration, na_action='ignore')
+
+    # Debugging: Print filtered DataFrame structure
+    print(f"Filtered DataFrame for {file_path}:\n", filtered_df.head())
+
+    # Convert DataFrame to list of tuples for batch insertion
+    data = [
+        (
+            row['date'],
+            row['narration'],
+            row['chq_ref_number'],
+            row['credit_amount'],
+            row['debit_amount'],
+            row['closing_balance'],
+            row['bank_name'],
+            row['generalized_narration']
+        )
+        for _, row in filtered_df.iterrows()
+    ]
+
+    # Debugging: Print data to be inserted
+    print(f"Data to be inserted for {file_path}:\n", data[:5])
+
+    # Insert data into the database
+    insert_data(cursor, data)
+    print(f"Data from {file_path} inserted successfully for {bank_name}.")
+    return len(data)
+
+
+def process_files(directory: str, bank_name: str = DEFAULT_BANK_NAME, insert: bool = True,
+                  commit_policy: str = COMMIT_PER_FILES, commit_every: int = 1) -> int:
+    """Process all files in a directory for a specified bank and return the number of failures.
+
+    Files are written through a pooled connection; each file runs in its own savepoint so a bad file
+    is skipped without rolling back the rest of the batch, and commits follow the given commit policy.
+    Every skipped file counts as a failure, and so does an error that stops the run.
+    """
+    failures = 0
+    file_summaries = {}
+    seen_keys = {}
     try:
-        # Loop through all CSV and TXT files in the specified directory
-        for filename in os.listdir(directory):
-            if filename.endswith(".csv") or filename.endswith(".txt"):
-                file_path = os.path.join(directory, filename)
-                print(f"Processing file: {file_path}")
-
-                # Process each file and optionally insert into the database
-                process_file(file_path, bank_name, cursor)
-
-                # Commit the transaction if insert is enabled
-                if insert:
-                    conn.commit()
-                    print(f"Transaction committed for file {filename}.")
+        # Make sure the generalized narration column and dashboard indexes exist before writing
+        if insert:
+            prepare_table(get_db_connection, TABLE_NAME)
+
+        with BatchWriter(get_db_connection, commit_policy, commit_every, insert=insert) as writer:
+            # Loop through all CSV and TXT files in the specified directory
+            for filename in os.listdir(directory):
+                if filename.endswith(".csv") or filename.endswith(".txt"):
+                    file_path = os.path.join(directory, filename)
+                    print(f"Processing file: {file_path}")
+
+                    # Process each file inside its own savepoint
+                    writer.write(file_path,
+                                 lambda cursor, path=file_path: process_file(path, bank_name, cursor, file_summaries,
+                                                                             seen_keys))
+        failures = len(writer.failed)
+
+        # Report per-file reconciliation results and missing statement periods
+        print_ingest_report(file_summaries, ['Bank'])
     except Exception as e:
-        conn.rollback()
         print(f"Error occurred: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        failures += 1
+    return failures
 
 
 if __name__ == "__main__":
     # Directory containing the CSV and TXT files
     csv_directory = 'StamentAnalysis/data/hdfc'  # Replace with your directory path
 
-    # Call the process_files function for HDFC bank with insert enabled
-    process_files(csv_directory, bank_name='HDFC', insert=True)
+    # Call the process_files function for HDFC bank with insert enabled, committing once per run
+    process_files(csv_directory, bank_name='HDFC', insert=True, commit_policy=COMMIT_PER_RUN)
 
     # You can call this function for other banks as well, for example:
     # process_files(csv_directory, bank_name='ICICI', insert=True)
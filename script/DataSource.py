@@ -0,0 +1,312 @@
+import threading
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Tuple
+from TransactionModel import CATEGORICAL_COLUMNS
+
+# Define the SQL table name
+TABLE_NAME = 'bank_statement_replica'
+
+# Rows shown on the dashboard carry either a debit or a credit, never both
+SINGLE_SIDED_CONDITION = '((debit_amount > 0 AND credit_amount = 0) OR (credit_amount > 0 AND debit_amount = 0))'
+
+# Columns identifying the account a transaction belongs to in the consolidated view
+ACCOUNT_COLUMNS = ['Bank', 'Account']
+
+# Column types of a consolidated partition, used when no partition is selected
+PARTITION_DTYPES = {
+    'Date': 'datetime64[s]',
+    'Narration': 'category',
+    'Chq/Ref Number': 'str',
+    'Credit Amount': 'int64',
+    'Debit Amount': 'int64',
+    'Closing Balance': 'int64',
+    'Source File': 'category',
+    'Generalized Narration': 'category',
+    'Bank': 'category',
+    'Account': 'category',
+}
+
+# Account reported for every bank by the SQL source, whose table does not record accounts
+ALL_ACCOUNTS = 'All accounts'
+
+
+def filter_narrations(df: pd.DataFrame, narrations: Optional[List[str]] = None,
+                      filter_mode: str = 'exclude') -> pd.DataFrame:
+    """Include or exclude the selected generalized narrations."""
+    # Apply the filter based on the selected mode (include/exclude)
+    if narrations:
+        if filter_mode == 'exclude':
+            df = df[~df['Generalized Narration'].isin(narrations)]
+        elif filter_mode == 'include':
+            df = df[df['Generalized Narration'].isin(narrations)]
+    return df
+
+
+def filter_accounts(df: pd.DataFrame, accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+    """Keep the selected (bank, account) pairs; frames without account columns hold a single account."""
+    if not accounts or not set(ACCOUNT_COLUMNS) <= set(df.columns):
+        return df
+    selected = pd.MultiIndex.from_frame(df[ACCOUNT_COLUMNS].astype(object)).isin(accounts)
+    return df[selected]
+
+
+class FrameDataSource:
+    """Serve dashboard queries from an in-memory compact transaction frame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    def account_keys(self) -> List[Tuple[str, str]]:
+        """Return the (bank, account) pairs in the frame; empty when the frame holds a single account."""
+        if not set(ACCOUNT_COLUMNS) <= set(self.df.columns):
+            return []
+        return sorted(self.df[ACCOUNT_COLUMNS].drop_duplicates().itertuples(index=False, name=None))
+
+    def date_range(self, accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        df = filter_accounts(self.df, accounts)
+        return df['Date'].min(), df['Date'].max()
+
+    def narrations(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                   accounts: Optional[List[Tuple[str, str]]] = None) -> List[str]:
+        return list(self._in_range(start_date, end_date, accounts)['Generalized Narration'].unique())
+
+    def transactions(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                     narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+                     accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        return filter_narrations(self._in_range(start_date, end_date, accounts), narrations, filter_mode)
+
+    def totals(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+               narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+               accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[int, int]:
+        """Return the (credit, debit) totals in paise."""
+        filtered_df = self.transactions(start_date, end_date, narrations, filter_mode, accounts)
+        return int(filtered_df['Credit Amount'].sum()), int(filtered_df['Debit Amount'].sum())
+
+    def _in_range(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                  accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        mask = (self.df['Date'] >= start_date) & (self.df['Date'] <= end_date)
+        return filter_accounts(self.df.loc[mask], accounts)
+
+
+class Partition(FrameDataSource):
+    """One account's transactions sorted by date, with a date index and running totals.
+
+    Date ranges are located by binary search instead of a scan, and unfiltered totals are the
+    difference of two running sums.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        super().__init__(df[df['Date'].notna()].sort_values('Date', kind='stable').reset_index(drop=True))
+        self.dates = self.df['Date'].to_numpy()
+
+        # Running totals with a leading zero: rows [lo, hi) sum to running[hi] - running[lo]
+        self.credit_running = np.concatenate(([0], self.df['Credit Amount'].to_numpy().cumsum()))
+        self.debit_running = np.concatenate(([0], self.df['Debit Amount'].to_numpy().cumsum()))
+
+    def date_range(self, accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        if not len(self.dates):
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(self.dates[0]), pd.Timestamp(self.dates[-1])
+
+    def totals(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+               narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+               accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[int, int]:
+        """Return the (credit, debit) totals in paise."""
+        if narrations and filter_mode in ('include', 'exclude'):
+            return super().totals(start_date, end_date, narrations, filter_mode)
+        lo, hi = self._bounds(start_date, end_date)
+        return (int(self.credit_running[hi] - self.credit_running[lo]),
+                int(self.debit_running[hi] - self.debit_running[lo]))
+
+    def _in_range(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                  accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        lo, hi = self._bounds(start_date, end_date)
+        return self.df.iloc[lo:hi]
+
+    def _bounds(self, start_date: pd.Timestamp, end_date: pd.Timestamp) -> Tuple[int, int]:
+        start = pd.Timestamp(start_date).to_datetime64().astype(self.dates.dtype)
+        end = pd.Timestamp(end_date).to_datetime64().astype(self.dates.dtype)
+        return (int(np.searchsorted(self.dates, start, side='left')),
+                int(np.searchsorted(self.dates, end, side='right')))
+
+
+class PartitionedDataSource:
+    """Serve the consolidated multi-bank view from per-account partitions loaded on first use.
+
+    `partitions` maps each (bank, account) to the location `loader(location, bank)` reads that account's
+    compact transaction frame from. A query only loads and scans the partitions of the selected accounts;
+    `on_load`, if given, is called with each partition's frame once it is loaded. Dash runs callbacks in
+    threads, so each partition is loaded under its own lock and `on_load` runs exactly once per account.
+    """
+
+    def __init__(self, partitions: dict, loader, on_load=None):
+        self.partitions = partitions
+        self.loader = loader
+        self.on_load = on_load
+        self.loaded = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def account_keys(self) -> List[Tuple[str, str]]:
+        return sorted(self.partitions)
+
+    def partition(self, key: Tuple[str, str]) -> Partition:
+        """Return an account's partition, loading and indexing it on first use."""
+        if key in self.loaded:
+            return self.loaded[key]
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            # Another callback may have loaded the account while this one waited
+            if key not in self.loaded:
+                bank_name, account = key
+                df = self.loader(self.partitions[key], bank_name).assign(Bank=bank_name, Account=account)
+                partition = Partition(df.astype({column: 'category' for column in ACCOUNT_COLUMNS}))
+                if self.on_load is not None:
+                    self.on_load(partition.df)
+                # Published only once analysed, so no query sees an account the engine has not
+                self.loaded[key] = partition
+        return self.loaded[key]
+
+    def date_range(self, accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        bounds = [partition.date_range() for partition in self._selected(accounts) if len(partition.dates)]
+        if not bounds:
+            return pd.NaT, pd.NaT
+        return min(start for start, _ in bounds), max(end for _, end in bounds)
+
+    def narrations(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                   accounts: Optional[List[Tuple[str, str]]] = None) -> List[str]:
+        narrations = set()
+        for partition in self._selected(accounts):
+            narrations.update(partition.narrations(start_date, end_date))
+        return sorted(narration for narration in narrations if isinstance(narration, str))
+
+    def transactions(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                     narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+                     accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        frames = [partition.transactions(start_date, end_date, narrations, filter_mode)
+                  for partition in self._selected(accounts)]
+        if not frames:
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in PARTITION_DTYPES.items()})
+        df = pd.concat(frames, ignore_index=True)
+
+        # Each partition has its own categories, which concat turns into object columns
+        for column in CATEGORICAL_COLUMNS + ACCOUNT_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+        return df
+
+    def totals(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+               narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+               accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[int, int]:
+        """Return the (credit, debit) totals in paise."""
+        totals = [partition.totals(start_date, end_date, narrations, filter_mode)
+                  for partition in self._selected(accounts)]
+        return sum(credit for credit, _ in totals), sum(debit for _, debit in totals)
+
+    def _selected(self, accounts: Optional[List[Tuple[str, str]]]) -> List[Partition]:
+        keys = [key for key in self.account_keys() if not accounts or key in accounts]
+        return [self.partition(key) for key in keys]
+
+
+class SqlDataSource:
+    """Serve dashboard queries by pushing date and narration filters and totals down to MySQL."""
+
+    def __init__(self, connection_factory, table_name: str = TABLE_NAME):
+        self.connection_factory = connection_factory
+        self.table_name = table_name
+
+    def account_keys(self) -> List[Tuple[str, str]]:
+        """Return one (bank, ALL_ACCOUNTS) pair per bank; the table does not record accounts."""
+        rows = self._query(f"SELECT DISTINCT bank_name FROM {self.table_name} ORDER BY bank_name")
+        return [(row[0], ALL_ACCOUNTS) for row in rows if row[0] is not None]
+
+    def date_range(self, accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        clause, params = self._bank_clause(accounts)
+        rows = self._query(f"SELECT MIN(date), MAX(date) FROM {self.table_name} WHERE {clause}", params)
+        return pd.to_datetime(rows[0][0]), pd.to_datetime(rows[0][1])
+
+    def narrations(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                   accounts: Optional[List[Tuple[str, str]]] = None) -> List[str]:
+        clause, params = self._bank_clause(accounts)
+        rows = self._query(
+            f"SELECT DISTINCT generalized_narration FROM {self.table_name} "
+            f"WHERE date BETWEEN %s AND %s AND {SINGLE_SIDED_CONDITION} AND {clause} ORDER BY generalized_narration",
+            [start_date.date(), end_date.date()] + params
+        )
+        return [row[0] for row in rows if row[0] is not None]
+
+    def transactions(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+                     narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+                     accounts: Optional[List[Tuple[str, str]]] = None) -> pd.DataFrame:
+        where, params = self._where(start_date, end_date, narrations, filter_mode, accounts)
+        rows = self._query(
+            f"SELECT date, narration, chq_ref_number, "
+            f"CAST(ROUND(debit_amount * 100) AS SIGNED), CAST(ROUND(credit_amount * 100) AS SIGNED), "
+            f"generalized_narration FROM {self.table_name} WHERE {where} ORDER BY date",
+            params
+        )
+        df = pd.DataFrame(rows, columns=['Date', 'Narration', 'Chq/Ref Number', 'Debit Amount',
+                                         'Credit Amount', 'Generalized Narration'])
+        df['Date'] = pd.to_datetime(df['Date']).astype('datetime64[s]')
+        df['Debit Amount'] = df['Debit Amount'].fillna(0).astype('int64')
+        df['Credit Amount'] = df['Credit Amount'].fillna(0).astype('int64')
+        df['Narration'] = df['Narration'].fillna('').astype('category')
+        df['Chq/Ref Number'] = df['Chq/Ref Number'].fillna('').astype(str)
+        df['Generalized Narration'] = df['Generalized Narration'].astype('category')
+        return df
+
+    def totals(self, start_date: pd.Timestamp, end_date: pd.Timestamp,
+               narrations: Optional[List[str]] = None, filter_mode: str = 'exclude',
+               accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[int, int]:
+        """Return the (credit, debit) totals in paise."""
+        where, params = self._where(start_date, end_date, narrations, filter_mode, accounts)
+        rows = self._query(
+            f"SELECT COALESCE(SUM(CAST(ROUND(credit_amount * 100) AS SIGNED)), 0), "
+            f"COALESCE(SUM(CAST(ROUND(debit_amount * 100) AS SIGNED)), 0) "
+            f"FROM {self.table_name} WHERE {where}",
+            params
+        )
+        return int(rows[0][0]), int(rows[0][1])
+
+    @staticmethod
+    def _bank_clause(accounts: Optional[List[Tuple[str, str]]]) -> Tuple[str, list]:
+        """Restrict to the banks of the selected accounts, served by the bank/date index."""
+        banks = sorted({bank_name for bank_name, _ in accounts or []})
+        if not banks:
+            return '1 = 1', []
+        return f"bank_name IN ({', '.join(['%s'] * len(banks))})", banks
+
+    @staticmethod
+    def _where(start_date: pd.Timestamp, end_date: pd.Timestamp, narrations: Optional[List[str]],
+               filter_mode: str, accounts: Optional[List[Tuple[str, str]]] = None) -> Tuple[str, list]:
+        clauses = ['date BETWEEN %s AND %s', SINGLE_SIDED_CONDITION]
+        params = [start_date.date(), end_date.date()]
+
+        if narrations and filter_mode in ('include', 'exclude'):
+            placeholders = ', '.join(['%s'] * len(narrations))
+            if filter_mode == 'exclude':
+                # Rows without a generalized narration are kept, as with the in-memory isin filter
+                clauses.append(f"(generalized_narration IS NULL OR generalized_narration NOT IN ({placeholders}))")
+            else:
+                clauses.append(f"generalized_narration IN ({placeholders})")
+            params.extend(narrations)
+
+        if accounts:
+            clause, bank_params = SqlDataSource._bank_clause(accounts)
+            clauses.append(clause)
+            params.extend(bank_params)
+
+        return ' AND '.join(clauses), params
+
+    def _query(self, query: str, params: Optional[list] = None) -> List[tuple]:
+        conn = self.connection_factory()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
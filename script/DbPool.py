@@ -0,0 +1,221 @@
+import time
+from mysql.connector import errorcode, errors, pooling
+
+# Commit policies for BatchWriter
+COMMIT_PER_ROWS = 'rows'  # Commit once at least `commit_every` rows are pending (checked after each file)
+COMMIT_PER_FILES = 'files'  # Commit after every `commit_every` files
+COMMIT_PER_RUN = 'run'  # Commit once at the end of the run
+
+# Pool and retry defaults
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+
+# MySQL errors worth retrying: lost connections, lock wait timeouts and deadlocks
+TRANSIENT_ERRNOS = {
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.ER_LOCK_WAIT_TIMEOUT,
+    errorcode.ER_LOCK_DEADLOCK,
+}
+
+# Connection losses after which a COMMIT may or may not have been applied by the server
+CONNECTION_LOST_ERRNOS = {
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+}
+
+# Pools shared across process_files calls, keyed by connection settings
+_pools = {}
+
+
+class AmbiguousCommitError(Exception):
+    """Raised when the connection is lost during COMMIT, so the pending files may or may not be in the table."""
+
+
+def get_pool(config: dict, pool_size: int = DEFAULT_POOL_SIZE) -> pooling.MySQLConnectionPool:
+    """Return the shared connection pool for the given connection settings, creating it on first use."""
+    key = tuple(sorted(config.items()))
+    if key not in _pools:
+        _pools[key] = pooling.MySQLConnectionPool(
+            pool_name=f"bank_statements_{len(_pools)}",
+            pool_size=pool_size,
+            pool_reset_session=True,
+            **config
+        )
+    return _pools[key]
+
+
+def is_transient(error: Exception) -> bool:
+    """Check whether a database error is worth retrying."""
+    return isinstance(error, errors.PoolError) or getattr(error, 'errno', None) in TRANSIENT_ERRNOS
+
+
+def with_retry(operation, description: str, max_retries: int = DEFAULT_MAX_RETRIES,
+               backoff_seconds: float = DEFAULT_BACKOFF_SECONDS):
+    """Run an operation, retrying transient database errors with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return operation()
+        except errors.Error as e:
+            if not is_transient(e) or attempt == max_retries:
+                raise
+            delay = backoff_seconds * 2 ** attempt
+            print(f"Transient error during {description}: {e}. Retrying in {delay:.1f}s "
+                  f"({attempt + 1}/{max_retries}).")
+            time.sleep(delay)
+
+
+class BatchWriter:
+    """Write files through a pooled connection, batching commits and isolating each file in a savepoint.
+
+    Each call to `write` runs `operation(cursor)` inside its own savepoint, so a bad file is rolled back
+    on its own and the rest of the batch is kept. Transient errors (lost connection, deadlock) abort the
+    whole open transaction, so the writer reconnects and replays the uncommitted files before going on.
+    """
+
+    def __init__(self, connection_factory, commit_policy: str = COMMIT_PER_FILES, commit_every: int = 1,
+                 insert: bool = True, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS):
+        if commit_policy not in (COMMIT_PER_ROWS, COMMIT_PER_FILES, COMMIT_PER_RUN):
+            raise ValueError(f"Unknown commit policy: {commit_policy}")
+
+        self.connection_factory = connection_factory
+        self.commit_policy = commit_policy
+        self.commit_every = max(commit_every, 1)
+        self.insert = insert
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self.conn = None
+        self.cursor = None
+        self._pending = []  # (label, operation) pairs written since the last commit
+        self._pending_rows = 0
+        self._savepoint_count = 0
+        self.failed = []  # Labels of the files rolled back to their savepoint
+
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None and self.insert:
+                self.commit()
+            elif self.conn is not None:
+                self.conn.rollback()
+        finally:
+            self._close()
+        return False
+
+    def write(self, label: str, operation) -> int:
+        """Run `operation(cursor)` for one file and return the number of rows it wrote."""
+        for attempt in range(self.max_retries + 1):
+            savepoint = self._next_savepoint()
+            try:
+                rows = self._run_in_savepoint(savepoint, operation)
+                break
+            except Exception as e:
+                if not is_transient(e):
+                    self._rollback_to_savepoint(savepoint)
+                    print(f"Error processing {label}, rolled back to savepoint {savepoint}: {e}")
+                    self.failed.append(label)
+                    return 0
+                if attempt == self.max_retries:
+                    raise
+                self._recover(e, attempt)
+
+        self._pending.append((label, operation))
+        self._pending_rows += rows
+
+        if self._should_commit():
+            self.commit()
+        return rows
+
+    def commit(self):
+        """Commit all pending files, replaying them on a fresh connection if the commit fails transiently.
+
+        Deadlocks and lock wait timeouts roll the transaction back, so replaying is safe. A connection lost
+        during COMMIT leaves the outcome unknown; replaying could insert the batch twice, so it is raised
+        as an AmbiguousCommitError instead.
+        """
+        if not self._pending or not self.insert:
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.conn.commit()
+                break
+            except errors.Error as e:
+                if getattr(e, 'errno', None) in CONNECTION_LOST_ERRNOS:
+                    labels = ', '.join(label for label, _ in self._pending)
+                    self._close()
+                    raise AmbiguousCommitError(
+                        f"Connection lost during COMMIT of {len(self._pending)} file(s), {self._pending_rows} "
+                        f"row(s); check the table for these files before re-running: {labels}") from e
+                if not is_transient(e) or attempt == self.max_retries:
+                    raise
+                self._recover(e, attempt)
+
+        print(f"Transaction committed for {len(self._pending)} file(s), {self._pending_rows} row(s).")
+        self._pending = []
+        self._pending_rows = 0
+
+    def _should_commit(self) -> bool:
+        if self.commit_policy == COMMIT_PER_ROWS:
+            return self._pending_rows >= self.commit_every
+        if self.commit_policy == COMMIT_PER_FILES:
+            return len(self._pending) >= self.commit_every
+        return False
+
+    def _next_savepoint(self) -> str:
+        self._savepoint_count += 1
+        return f"file_{self._savepoint_count}"
+
+    def _run_in_savepoint(self, savepoint: str, operation) -> int:
+        self.cursor.execute(f"SAVEPOINT {savepoint}")
+        rows = operation(self.cursor) or 0
+        self.cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+        return rows
+
+    def _rollback_to_savepoint(self, savepoint: str):
+        try:
+            self.cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+        except errors.Error as e:
+            if not is_transient(e):
+                raise
+            self._recover(e, 0)
+
+    def _recover(self, error: Exception, attempt: int):
+        """Back off, reconnect and replay the files written since the last commit."""
+        delay = self.backoff_seconds * 2 ** attempt
+        print(f"Transient error: {error}. Replaying {len(self._pending)} uncommitted file(s) in {delay:.1f}s "
+              f"({attempt + 1}/{self.max_retries}).")
+        time.sleep(delay)
+        with_retry(self._replay_pending, 'replay of uncommitted files', self.max_retries, self.backoff_seconds)
+
+    def _replay_pending(self):
+        self._close()
+        self._connect()
+        self._pending_rows = 0
+        for _, operation in self._pending:
+            self._pending_rows += self._run_in_savepoint(self._next_savepoint(), operation)
+
+    def _connect(self):
+        self.conn = with_retry(self.connection_factory, 'connect', self.max_retries, self.backoff_seconds)
+        self.conn.autocommit = False
+        self.cursor = self.conn.cursor()
+
+    def _close(self):
+        # Closing a pooled connection hands it back to the pool; a dead connection may fail to close
+        try:
+            if self.cursor is not None:
+                self.cursor.close()
+            if self.conn is not None:
+                self.conn.close()
+        except errors.Error:
+            pass
+        finally:
+            self.cursor = None
+            self.conn = None
@@ -0,0 +1,78 @@
+from TransactionModel import get_generalized_narration
+
+# Define the SQL table name
+TABLE_NAME = 'bank_statement_replica'
+
+# Column added to the table so narration filters can be pushed down to MySQL
+GENERALIZED_NARRATION_COLUMN = 'generalized_narration VARCHAR(512) NULL'
+
+# Indexes backing the dashboard queries: date range scans, per-bank ranges and narration filters
+INDEXES = {
+    'idx_date_narration': 'date, generalized_narration',
+    'idx_bank_date': 'bank_name, date',
+    'idx_narration_date': 'generalized_narration, date',
+}
+
+
+def ensure_schema(cursor, table_name: str = TABLE_NAME):
+    """Add the generalized narration column and the dashboard indexes to the table if they are missing."""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'generalized_narration'",
+        (table_name,)
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {GENERALIZED_NARRATION_COLUMN}")
+        print(f"Added generalized_narration column to {table_name}.")
+
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (table_name,)
+    )
+    existing_indexes = {row[0] for row in cursor.fetchall()}
+    for index_name, columns in INDEXES.items():
+        if index_name not in existing_indexes:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({columns})")
+            print(f"Created index {index_name} on {table_name} ({columns}).")
+
+
+def backfill_generalized_narrations(cursor, table_name: str = TABLE_NAME) -> int:
+    """Fill generalized_narration for rows ingested before the column existed and return the rows updated."""
+    cursor.execute(f"SELECT DISTINCT narration FROM {table_name} "
+                   f"WHERE generalized_narration IS NULL AND narration IS NOT NULL")
+    narrations = [row[0] for row in cursor.fetchall()]
+    if not narrations:
+        return 0
+
+    # Patterns are evaluated in Python, once per distinct narration, then applied with a single join
+    cursor.execute("CREATE TEMPORARY TABLE narration_map "
+                   "(narration TEXT, generalized_narration VARCHAR(512), KEY (narration(255)))")
+    try:
+        cursor.executemany(
+            "INSERT INTO narration_map (narration, generalized_narration) VALUES (%s, %s)",
+            [(narration, get_generalized_narration(narration)) for narration in narrations]
+        )
+        cursor.execute(
+            f"UPDATE {table_name} t JOIN narration_map m ON t.narration = m.narration "
+            f"SET t.generalized_narration = m.generalized_narration WHERE t.generalized_narration IS NULL"
+        )
+        updated = cursor.rowcount
+    finally:
+        cursor.execute("DROP TEMPORARY TABLE narration_map")
+
+    print(f"Backfilled generalized narration for {updated} rows in {table_name}.")
+    return updated
+
+
+def prepare_table(connection_factory, table_name: str = TABLE_NAME):
+    """Bring the table schema up to date on its own connection; DDL implicitly commits in MySQL."""
+    conn = connection_factory()
+    cursor = conn.cursor()
+    try:
+        ensure_schema(cursor, table_name)
+        backfill_generalized_narrations(cursor, table_name)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
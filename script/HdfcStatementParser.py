@@ -1,177 +1,263 @@
-import os
+import threading
 import pandas as pd
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 import plotly.graph_objects as go
-import re
-
-
-# Function to format amounts in Indian Rupee format
-def format_inr(amount):
-    return "{:,.2f}".format(amount)
+from Analytics import AnomalyEngine, group_keys
+from DataSource import ACCOUNT_COLUMNS, FrameDataSource, PartitionedDataSource, SqlDataSource, filter_accounts
+from StatementLoader import discover_partitions, load_transactions
+from TransactionModel import format_paise, to_rupees
 
 
 # Directory containing the text files
 directory_path = '/home/codeplay/PycharmProjects/StamentAnalysis/data/hdfc'
 
-# Initialize an empty DataFrame to hold all data
-df_list = []
-
-# Loop through all text files in the directory and read them into DataFrames
-for filename in os.listdir(directory_path):
-    if filename.endswith(".txt"):
-        file_path = os.path.join(directory_path, filename)
-        temp_df = pd.read_csv(
-            file_path,
-            delimiter=',',
-            skipinitialspace=True,
-            names=[
-                'Date', 'Narration', 'Value Date', 'Debit Amount',
-                'Credit Amount', 'Chq/Ref Number', 'Closing Balance'
-            ],
-            header=0,
-            dtype={
-                'Date': str,
-                'Narration': str,
-                'Value Date': str,
-                'Debit Amount': str,
-                'Credit Amount': str,
-                'Chq/Ref Number': str,
-                'Closing Balance': str
-            }
-        )
+# Statement directories per bank for the consolidated view; sub-directories hold one account each
+BANK_DIRECTORIES = {
+    'HDFC': '/home/codeplay/PycharmProjects/StamentAnalysis/data/hdfc',
+    'ICICI': '/home/codeplay/PycharmProjects/StamentAnalysis/data/icici',
+    'SBI': '/home/codeplay/PycharmProjects/StamentAnalysis/data/sbi'
+}
+
+# Where the dashboard reads transactions from: 'files' loads the .txt statements into memory,
+# 'sql' pushes filters and totals down to the bank_statement_replica table filled by the ingest scripts,
+# 'consolidated' loads every bank and account in BANK_DIRECTORIES as separate partitions on first use
+DATA_SOURCE = 'files'
+
+# Days of history the analytics engine is seeded with in sql mode, so the whole table is never read into
+# memory; long enough to see three yearly payments
+ANALYTICS_HISTORY_DAYS = 800
+
+# Days shown when the dashboard opens in sql mode; older days are fetched only when picked in the date range
+SQL_DEFAULT_RANGE_DAYS = 90
+
+# Separates bank and account in the account filter values
+ACCOUNT_SEPARATOR = ' / '
+
+# Database connection details for localhost MySQL (used when DATA_SOURCE is 'sql')
+DB_HOST = 'localhost'
+DB_PORT = 3306  # Default MySQL port
+DB_NAME = 'finance_db'  # Replace with your database name
+DB_USER = 'mysql'  # Replace with your username
+DB_PASSWORD = 'mysql'  # Replace with your password
+
+
+def get_db_connection():
+    """Borrow a MySQL connection from the shared connection pool.
+
+    Concurrent callbacks can empty the pool, and mysql-connector raises PoolError at once instead of
+    waiting, so the borrow is retried with backoff until a connection is handed back.
+    """
+    from DbPool import get_pool, with_retry
+
+    pool = get_pool({
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'database': DB_NAME,
+        'user': DB_USER,
+        'password': DB_PASSWORD
+    })
+    return with_retry(pool.get_connection, 'connection pool checkout')
+
+
+# Data source the dashboard callbacks query; built on first use so importing this module stays cheap
+source = None
+source_lock = threading.Lock()  # Callbacks run in threads; only one of them builds and primes the source
+
+# Batch analytics engine detecting recurring payments and spending spikes per generalized narration
+engine = AnomalyEngine()
+
+
+def get_source():
+    """Build the configured data source on first use and run the initial analytics pass.
+
+    The consolidated source reads no statement here: each account is analysed when it is first loaded.
+    """
+    global source
+    with source_lock:
+        if source is None and DATA_SOURCE == 'consolidated':
+            source = PartitionedDataSource(discover_partitions(BANK_DIRECTORIES), load_transactions,
+                                           on_load=engine.add_account)
+        elif source is None:
+            if DATA_SOURCE == 'sql':
+                new_source = SqlDataSource(get_db_connection)
+            else:
+                new_source = FrameDataSource(load_transactions(directory_path))
+            start_date, end_date = new_source.date_range()
+            if DATA_SOURCE == 'sql':
+                start_date = max(start_date, end_date - pd.Timedelta(days=ANALYTICS_HISTORY_DAYS))
+            engine.update(new_source.transactions(start_date, end_date))
+            source = new_source
+    return source
+
+
+def refresh_analytics():
+    """Feed only the days ingested since the last analytics run into the engine.
+
+    Only the sql source sees new days while the dashboard runs; statement files are read once.
+    """
+    if DATA_SOURCE != 'sql':
+        return
+
+    # Concurrent callbacks take turns; each re-reads last_date so the same days are never fetched twice
+    with engine.lock:
+        if engine.last_date is None:
+            return
+        engine.update(get_source().transactions(engine.last_date + pd.Timedelta(days=1),
+                                                pd.Timestamp.today().normalize()))
+
+
+def get_selected_accounts(banks, accounts):
+    """Turn the bank and account filters into (bank, account) pairs; None selects every account."""
+    if accounts:
+        return [tuple(account.split(ACCOUNT_SEPARATOR, 1)) for account in accounts]
+    if banks:
+        return [key for key in get_source().account_keys() if key[0] in banks]
+    return None
 
-        # Remove leading and trailing spaces from all fields in the DataFrame
-        temp_df = temp_df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
 
-        # Convert 'Date' column to datetime format, handle parsing errors
-        temp_df['Date'] = pd.to_datetime(temp_df['Date'], format='%d/%m/%y', errors='coerce')
-
-        # Convert 'Debit Amount' and 'Credit Amount' to numeric, handling errors
-        temp_df['Debit Amount'] = pd.to_numeric(temp_df['Debit Amount'].str.replace(',', ''), errors='coerce').fillna(0)
-        temp_df['Credit Amount'] = pd.to_numeric(temp_df['Credit Amount'].str.replace(',', ''), errors='coerce').fillna(
-            0)
+# Initialize Dash app
+app = dash.Dash(__name__)
+app.title = "Financial Data Analysis"
 
-        # Remove redundant transactions: Keep only rows where either debit or credit is non-zero
-        temp_df = temp_df[(temp_df['Debit Amount'] > 0) & (temp_df['Credit Amount'] == 0) |
-                          (temp_df['Credit Amount'] > 0) & (temp_df['Debit Amount'] == 0)]
 
-        # Append the temporary DataFrame to the list
-        df_list.append(temp_df)
+# Layout of the app, built per page load once the data source is available
+def serve_layout():
+    # The consolidated view leaves the dates open until accounts are chosen, so no statement is read yet
+    if DATA_SOURCE == 'consolidated':
+        start_date_bound, end_date_bound = None, None
+    else:
+        start_date_bound, end_date_bound = get_source().date_range()
 
-# Combine all DataFrames into a single DataFrame
-df = pd.concat(df_list, ignore_index=True)
+    account_keys = get_source().account_keys()
 
+    # Open on recent days in sql mode so the first graph does not pull the whole table into memory
+    if DATA_SOURCE == 'sql':
+        start_date_bound = max(start_date_bound, end_date_bound - pd.Timedelta(days=SQL_DEFAULT_RANGE_DAYS))
 
-# Function to extract generalized narration patterns
-def get_generalized_narration(narration):
-    # Group narrations starting with 'UPI-'
-    match = re.match(r'UPI-[^@]+', narration)
-    if match:
-        return match.group()
+    return html.Div([
+        html.H1("Financial Data Analysis", style={'text-align': 'center', 'font-size': '30px', 'margin-bottom': '30px',
+                                                  'text-decoration': 'underline'}),
 
-    # Group narrations starting with 'ACH D- INDIAN CLEARING CORP-' and remove the part after the last hyphen
-    match = re.match(r'(ACH D- INDIAN CLEARING CORP)-[^-]+', narration)
-    if match:
-        return match.group(1)  # Return only the general part before the last hyphen
+        # Date range picker
+        dcc.DatePickerRange(
+            id='date-picker-range',
+            start_date=start_date_bound,
+            end_date=end_date_bound,
+            display_format='DD/MM/YYYY',
+            style={'margin': '20px'}
+        ),
 
-    # Add more patterns as needed here, for now return the original narration
-    return narration
+        # Bank and account filters; leaving both empty shows every account. Hidden (but kept for the
+        # callbacks) when the source holds a single account
+        html.Div(
+            id='account-filters',
+            style={} if account_keys else {'display': 'none'},
+            children=[
+                dcc.Dropdown(
+                    id='bank-dropdown',
+                    multi=True,
+                    placeholder="All Banks",
+                    style={'margin': '20px', 'width': '50%'},
+                    options=sorted({bank_name for bank_name, _ in account_keys}),
+                ),
+                dcc.Dropdown(
+                    id='account-dropdown',
+                    multi=True,
+                    placeholder="All Accounts",
+                    style={'margin': '20px', 'width': '50%'},
+                    options=[],
+                ),
+            ]
+        ),
 
+        # Toggle button for narration filter
+        html.Button(
+            'Toggle Narration Filter',
+            id='toggle-button',
+            n_clicks=0,
+            style={'margin': '10px'}
+        ),
 
-# Create a new column in the DataFrame for generalized narration patterns (for filtering only)
-df['Generalized Narration'] = df['Narration'].apply(get_generalized_narration)
+        # Narration filter dropdown (uses Generalized Narration for options)
+        dcc.Dropdown(
+            id='narration-dropdown',
+            multi=True,  # Allow multiple selections
+            placeholder="Select Narration(s)",
+            style={'margin': '20px', 'max-height': '400px', 'width': '50%'},
+            options=[],
+        ),
 
-# Initialize Dash app
-app = dash.Dash(__name__)
-app.title = "Financial Data Analysis"
+        # Collapsible checklist for bulk selection
+        html.Div(
+            id='narration-checklist-container',
+            style={'display': 'none', 'margin': '20px', 'width': '50%'},  # Keep the width unchanged
+            children=[
+                # Search bar for checklist
+                dcc.Input(
+                    id='checklist-search',
+                    type='text',
+                    placeholder='Search Narration...',
+                    style={'width': '100%', 'margin-bottom': '10px'}
+                ),
+                html.Div(
+                    id='select-clear-buttons',
+                    style={'display': 'none', 'margin-bottom': '10px'},
+                    children=[
+                        html.Button('Select All', id='select-all-button', n_clicks=0, style={'margin-right': '10px'}),
+                        html.Button('Clear All', id='clear-all-button', n_clicks=0)
+                    ]
+                ),
+                dcc.Checklist(
+                    id='narration-checklist',
+                    style={
+                        'overflowY': 'scroll',
+                        'maxHeight': '180px',  # Adjust the height here to 60% of 300px (original height)
+                        'width': '100%'
+                    },
+                    options=[]
+                )
+            ]
+        )
+        ,
+
+        # Include/Exclude radio buttons
+        dcc.RadioItems(
+            id='filter-mode',
+            options=[
+                {'label': 'Include Selected Narrations', 'value': 'include'},
+                {'label': 'Exclude Selected Narrations', 'value': 'exclude'}
+            ],
+            value='exclude',
+            labelStyle={'display': 'inline-block', 'margin-right': '10px'},
+            style={'text-align': 'center', 'margin-bottom': '20px'}
+        ),
 
-# Layout of the app
-app.layout = html.Div([
-    html.H1("Financial Data Analysis", style={'text-align': 'center', 'font-size': '30px', 'margin-bottom': '30px',
-                                              'text-decoration': 'underline'}),
-
-    # Date range picker
-    dcc.DatePickerRange(
-        id='date-picker-range',
-        start_date=df['Date'].min(),
-        end_date=df['Date'].max(),
-        display_format='DD/MM/YYYY',
-        style={'margin': '20px'}
-    ),
-
-    # Toggle button for narration filter
-    html.Button(
-        'Toggle Narration Filter',
-        id='toggle-button',
-        n_clicks=0,
-        style={'margin': '10px'}
-    ),
-
-    # Narration filter dropdown (uses Generalized Narration for options)
-    dcc.Dropdown(
-        id='narration-dropdown',
-        multi=True,  # Allow multiple selections
-        placeholder="Select Narration(s)",
-        style={'margin': '20px', 'max-height': '400px', 'width': '50%'},
-        options=[],
-    ),
-
-    # Collapsible checklist for bulk selection
-    html.Div(
-        id='narration-checklist-container',
-        style={'display': 'none', 'margin': '20px', 'width': '50%'},  # Keep the width unchanged
-        children=[
-            # Search bar for checklist
-            dcc.Input(
-                id='checklist-search',
-                type='text',
-                placeholder='Search Narration...',
-                style={'width': '100%', 'margin-bottom': '10px'}
-            ),
-            html.Div(
-                id='select-clear-buttons',
-                style={'display': 'none', 'margin-bottom': '10px'},
-                children=[
-                    html.Button('Select All', id='select-all-button', n_clicks=0, style={'margin-right': '10px'}),
-                    html.Button('Clear All', id='clear-all-button', n_clicks=0)
-                ]
-            ),
-            dcc.Checklist(
-                id='narration-checklist',
-                style={
-                    'overflowY': 'scroll',
-                    'maxHeight': '180px',  # Adjust the height here to 60% of 300px (original height)
-                    'width': '100%'
-                },
-                options=[]
-            )
-        ]
-    )
-    ,
+        # Analytics layers drawn on top of the graph
+        dcc.Checklist(
+            id='analytics-layers',
+            options=[
+                {'label': 'Highlight Recurring Payments', 'value': 'recurring'},
+                {'label': 'Highlight Spending Spikes', 'value': 'spikes'}
+            ],
+            value=[],
+            labelStyle={'display': 'inline-block', 'margin-right': '10px'},
+            style={'text-align': 'center', 'margin-bottom': '20px'}
+        ),
 
-    # Include/Exclude radio buttons
-    dcc.RadioItems(
-        id='filter-mode',
-        options=[
-            {'label': 'Include Selected Narrations', 'value': 'include'},
-            {'label': 'Exclude Selected Narrations', 'value': 'exclude'}
-        ],
-        value='exclude',
-        labelStyle={'display': 'inline-block', 'margin-right': '10px'},
-        style={'text-align': 'center', 'margin-bottom': '20px'}
-    ),
+        # Display total credit, total debit, and total days in the selected range
+        html.Div(id='total-info', style={'font-size': '18px', 'margin': '20px', 'text-align': 'center'}),
 
-    # Display total credit, total debit, and total days in the selected range
-    html.Div(id='total-info', style={'font-size': '18px', 'margin': '20px', 'text-align': 'center'}),
+        # Display credit-debit difference
+        html.Div(id='credit-debit-difference', style={'font-size': '20px', 'margin': '20px', 'text-align': 'center'}),
 
-    # Display credit-debit difference
-    html.Div(id='credit-debit-difference', style={'font-size': '20px', 'margin': '20px', 'text-align': 'center'}),
+        # Graph for credits and debits over time
+        dcc.Graph(id='credits-debits-graph'),
 
-    # Graph for credits and debits over time
-    dcc.Graph(id='credits-debits-graph'),
-])
+        # Recurring payments detected in the selected range
+        html.Div(id='recurring-payments', style={'font-size': '16px', 'margin': '20px'}),
+    ])
 
 
 # Function to determine the color based on the debit amount
@@ -186,30 +272,64 @@ def get_debit_color(amount):
         return 'blue'  # Default color for debits <= 1000
 
 
-# Callback to update narration filter options based on selected date range and search input
+def get_account_prefix(row):
+    """Label a recurring payment with its bank and account in the consolidated view."""
+    if not set(ACCOUNT_COLUMNS) <= set(row.index):
+        return ''
+    return ACCOUNT_SEPARATOR.join(str(row[column]) for column in ACCOUNT_COLUMNS) + ': '
+
+
+# Callback to list the accounts of the selected banks
+@app.callback(
+    Output('account-dropdown', 'options'),
+    Input('bank-dropdown', 'value')
+)
+def update_account_options(banks):
+    return [f"{bank_name}{ACCOUNT_SEPARATOR}{account}" for bank_name, account in get_source().account_keys()
+            if not banks or bank_name in banks]
+
+
+# Callback to set the date range to the selected accounts' statements in the consolidated view
+@app.callback(
+    [Output('date-picker-range', 'start_date'),
+     Output('date-picker-range', 'end_date')],
+    [Input('bank-dropdown', 'value'),
+     Input('account-dropdown', 'value')]
+)
+def update_date_range(banks, accounts):
+    if DATA_SOURCE != 'consolidated':
+        return dash.no_update, dash.no_update
+    if not banks and not accounts:
+        return None, None
+
+    # Only the selected accounts are loaded
+    return get_source().date_range(get_selected_accounts(banks, accounts))
+
+
+# Callback to update narration filter options based on selected date range, accounts and search input
 @app.callback(
     [Output('narration-dropdown', 'options'),
      Output('narration-checklist', 'options'),
      Output('select-clear-buttons', 'style')],
     [Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
-     Input('checklist-search', 'value')]
+     Input('checklist-search', 'value'),
+     Input('bank-dropdown', 'value'),
+     Input('account-dropdown', 'value')]
 )
-def update_narration_options(start_date, end_date, search_value):
+def update_narration_options(start_date, end_date, search_value, banks, accounts):
     # Convert the input start_date and end_date to datetime objects
     try:
         start_date = pd.to_datetime(start_date)
         end_date = pd.to_datetime(end_date)
     except Exception as e:
         return [], [], {'display': 'none'}  # Return empty list and hide buttons if date conversion fails
+    if pd.isna(start_date) or pd.isna(end_date):
+        return [], [], {'display': 'none'}
 
-    # Filter the data based on the selected date range
-    mask = (df['Date'] >= start_date) & (df['Date'] <= end_date)
-    filtered_df = df.loc[mask]
-
-    # Get unique generalized narrations for the filtered date range
+    # Get unique generalized narrations for the selected date range
     unique_narrations = [{'label': narration, 'value': narration} for narration in
-                         filtered_df['Generalized Narration'].unique()]
+                         get_source().narrations(start_date, end_date, get_selected_accounts(banks, accounts))]
 
     # Filter options based on search input if provided
     if search_value:
@@ -272,11 +392,16 @@ def toggle_select_clear(n_clicks_toggle, n_clicks_select_all, n_clicks_clear_all
      Input('date-picker-range', 'end_date'),
      Input('narration-dropdown', 'value'),
      Input('narration-checklist', 'value'),
-     Input('filter-mode', 'value')]
+     Input('filter-mode', 'value'),
+     Input('analytics-layers', 'value'),
+     Input('bank-dropdown', 'value'),
+     Input('account-dropdown', 'value')]
 )
-def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value, filter_mode):
+def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value, filter_mode, analytics_layers,
+                          banks, accounts):
     # Determine the effective narration selection based on whether checklist or dropdown is visible
     selected_narrations = checklist_value if checklist_value else dropdown_value
+    selected_accounts = get_selected_accounts(banks, accounts)
 
     # Convert the input start_date and end_date to datetime objects
     try:
@@ -284,39 +409,37 @@ def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value,
         end_date = pd.to_datetime(end_date)
     except Exception as e:
         return go.Figure(), f"Invalid date format. Error: {str(e)}", ""
+    if pd.isna(start_date) or pd.isna(end_date):
+        if DATA_SOURCE == 'consolidated':
+            return go.Figure(), "Select a bank or account, or a date range, to load statements.", ""
+        return go.Figure(), "Select a date range.", ""
 
-    # Filter the data based on the selected date range
-    mask = (df['Date'] >= start_date) & (df['Date'] <= end_date)
-    filtered_df = df.loc[mask]
+    # Pick up newly ingested days before drawing the analytics layers
+    if analytics_layers:
+        refresh_analytics()
 
-    # Apply the filter based on the selected mode (include/exclude)
-    if selected_narrations:
-        if filter_mode == 'exclude':
-            # Exclude based on the generalized narration pattern
-            filtered_df = filtered_df[~filtered_df['Generalized Narration'].isin(selected_narrations)]
-        elif filter_mode == 'include':
-            # Include based on the generalized narration pattern
-            filtered_df = filtered_df[filtered_df['Generalized Narration'].isin(selected_narrations)]
+    # Filter the data based on the selected date range and narration filter mode (include/exclude)
+    filtered_df = get_source().transactions(start_date, end_date, selected_narrations, filter_mode, selected_accounts)
 
     # Separate filtered debit and credit data
     filtered_debit_df = filtered_df[filtered_df['Debit Amount'] > 0]
     filtered_credit_df = filtered_df[filtered_df['Credit Amount'] > 0]
 
-    # Calculate total debit, total credit, and total days in the selected range
-    total_debit = filtered_debit_df['Debit Amount'].sum()
-    total_credit = filtered_credit_df['Credit Amount'].sum()
+    # Calculate total debit, total credit, and total days in the selected range (exact sums in paise)
+    total_credit, total_debit = get_source().totals(start_date, end_date, selected_narrations, filter_mode,
+                                                    selected_accounts)
     total_days = (end_date - start_date).days + 1  # Adding 1 to include both start and end date
     credit_debit_diff = total_credit - total_debit  # Calculate the difference between credit and debit
 
     # Format total debit and credit in Indian Rupee format
-    total_info_text = (f"Total Credit: ₹{format_inr(total_credit)} | "
-                       f"Total Debit: ₹{format_inr(total_debit)} | "
+    total_info_text = (f"Total Credit: ₹{format_paise(total_credit)} | "
+                       f"Total Debit: ₹{format_paise(total_debit)} | "
                        f"Total Days: {total_days}")
 
     # Determine color for credit-debit difference
     diff_color = 'green' if credit_debit_diff >= 0 else 'red'
     credit_debit_diff_text = html.Div(
-        f"Credit - Debit Difference: ₹{format_inr(credit_debit_diff)}",
+        f"Credit - Debit Difference: ₹{format_paise(credit_debit_diff)}",
         style={'color': diff_color, 'font-weight': 'bold'}
     )
 
@@ -326,18 +449,18 @@ def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value,
     # Debit transactions with color coding based on amount
     fig.add_trace(go.Scatter(
         x=filtered_debit_df['Date'],
-        y=filtered_debit_df['Debit Amount'],
+        y=to_rupees(filtered_debit_df['Debit Amount']),
         mode='markers',
         name='Debit Amount',
         marker=dict(
-            color=[get_debit_color(amount) for amount in filtered_debit_df['Debit Amount']],
+            color=[get_debit_color(amount) for amount in to_rupees(filtered_debit_df['Debit Amount'])],
             size=10
         ),
         hoverinfo='text',
         hovertext=(
                 'Date: ' + filtered_debit_df['Date'].dt.strftime('%d-%m-%Y') + '<br>' +
-                'Amount: ₹' + filtered_debit_df['Debit Amount'].apply(format_inr) + '<br>' +
-                'Narration: ' + filtered_debit_df['Narration'] + '<br>' +
+                'Amount: ₹' + filtered_debit_df['Debit Amount'].apply(format_paise) + '<br>' +
+                'Narration: ' + filtered_debit_df['Narration'].astype(str) + '<br>' +
                 'Chq/Ref Number: ' + filtered_debit_df['Chq/Ref Number']
         )
     ))
@@ -345,19 +468,52 @@ def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value,
     # Credit transactions (green dots)
     fig.add_trace(go.Scatter(
         x=filtered_credit_df['Date'],
-        y=filtered_credit_df['Credit Amount'],
+        y=to_rupees(filtered_credit_df['Credit Amount']),
         mode='markers',
         name='Credit Amount',
         marker=dict(color='green', size=10),
         hoverinfo='text',
         hovertext=(
                 'Date: ' + filtered_credit_df['Date'].dt.strftime('%d-%m-%Y') + '<br>' +
-                'Amount: ₹' + filtered_credit_df['Credit Amount'].apply(format_inr) + '<br>' +
-                'Narration: ' + filtered_credit_df['Narration'] + '<br>' +
+                'Amount: ₹' + filtered_credit_df['Credit Amount'].apply(format_paise) + '<br>' +
+                'Narration: ' + filtered_credit_df['Narration'].astype(str) + '<br>' +
                 'Chq/Ref Number: ' + filtered_credit_df['Chq/Ref Number']
         )
     ))
 
+    # Ring debits paid to recurring payees
+    if 'recurring' in (analytics_layers or []) and not engine.recurring.empty:
+        # Match on the engine's payee keys, which include bank and account in the consolidated view
+        keys = group_keys(engine.recurring)
+        recurring_debit_df = filtered_debit_df[pd.MultiIndex.from_frame(filtered_debit_df[keys].astype(object)).isin(
+            pd.MultiIndex.from_frame(engine.recurring[keys].astype(object)))]
+        fig.add_trace(go.Scatter(
+            x=recurring_debit_df['Date'],
+            y=to_rupees(recurring_debit_df['Debit Amount']),
+            mode='markers',
+            name='Recurring Payment',
+            marker=dict(symbol='diamond-open', color='orange', size=16, line=dict(width=2)),
+            hoverinfo='skip'
+        ))
+
+    # Circle debits far above the usual amount for their narration
+    if 'spikes' in (analytics_layers or []):
+        spikes_df = engine.spikes_between(start_date, end_date, selected_narrations, filter_mode, selected_accounts)
+        if not spikes_df.empty:
+            fig.add_trace(go.Scatter(
+                x=spikes_df['Date'],
+                y=to_rupees(spikes_df['Debit Amount']),
+                mode='markers',
+                name='Spending Spike',
+                marker=dict(symbol='circle-open', color='black', size=20, line=dict(width=2)),
+                hoverinfo='text',
+                hovertext=(
+                        'Spike: ₹' + spikes_df['Debit Amount'].apply(format_paise) + '<br>' +
+                        'Usual: ₹' + spikes_df['Baseline'].apply(format_paise) + '<br>' +
+                        'Narration: ' + spikes_df['Narration'].astype(str)
+                )
+            ))
+
     fig.update_layout(
         title=f'Credits and Debits Over Time ({start_date.strftime("%d-%m-%Y")} to {end_date.strftime("%d-%m-%Y")})',
         xaxis_title='Date',
@@ -371,6 +527,58 @@ def update_graph_and_info(start_date, end_date, dropdown_value, checklist_value,
     return fig, total_info_text, credit_debit_diff_text
 
 
+# Callback to list the recurring payments seen in the selected date range
+@app.callback(
+    Output('recurring-payments', 'children'),
+    [Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('analytics-layers', 'value'),
+     Input('bank-dropdown', 'value'),
+     Input('account-dropdown', 'value')]
+)
+def update_recurring_payments(start_date, end_date, analytics_layers, banks, accounts):
+    if 'recurring' not in (analytics_layers or []):
+        return []
+
+    try:
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+    except Exception as e:
+        return html.P(f"Invalid date format. Error: {str(e)}")
+    if pd.isna(start_date) or pd.isna(end_date):
+        return []
+
+    # Reading the narrations first loads (and analyses) the selected accounts in the consolidated view
+    selected_accounts = get_selected_accounts(banks, accounts)
+    active_narrations = set(get_source().narrations(start_date, end_date, selected_accounts))
+
+    # Pick up newly ingested days before reporting
+    refresh_analytics()
+    if engine.recurring.empty:
+        return html.P("No recurring payments detected.")
+
+    # Payees still being paid within the selected range
+    recurring_df = engine.recurring[engine.recurring['Last Date'] >= start_date]
+    recurring_df = recurring_df[recurring_df['Generalized Narration'].isin(active_narrations)]
+    recurring_df = filter_accounts(recurring_df, selected_accounts)
+
+    return [
+        html.H3("Recurring Payments"),
+        html.Ul([
+            html.Li(f"{get_account_prefix(row)}{row['Generalized Narration']}: "
+                    f"{row['Period']} ₹{format_paise(row['Typical Amount'])} "
+                    f"({row['Occurrences']} payments, next expected {row['Next Expected'].strftime('%d-%m-%Y')})")
+            for _, row in recurring_df.iterrows()
+        ])
+    ]
+
+
+def run_app(**kwargs):
+    """Attach the layout, which loads the data source, and start the Dash server."""
+    app.layout = serve_layout
+    app.run(**kwargs)
+
+
 # Run the app
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    run_app(debug=True)
@@ -0,0 +1,173 @@
+import pandas as pd
+from typing import List, Optional, Tuple
+from TransactionModel import format_paise, to_paise
+
+# Columns identifying one physical transaction; identical rows across files are duplicates
+DUPLICATE_COLUMNS = ['Date', 'Narration', 'Chq/Ref Number', 'Debit Amount', 'Credit Amount', 'Closing Balance']
+
+# Column recording which statement file each row came from
+SOURCE_FILE_COLUMN = 'Source File'
+
+# Number of offending rows printed per file in the reconciliation report
+REPORT_SAMPLE_ROWS = 5
+
+
+class ReconciliationError(Exception):
+    """Raised when a statement file fails reconciliation and must not be written to MySQL."""
+
+
+def reconcile(df: pd.DataFrame, account_keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Check every row's closing balance against the previous balance plus its credit minus its debit.
+
+    Expects int64 paise amounts with rows in statement order. The balance chain runs within each account
+    and source file, so no sort is needed; continuity between files is checked by find_missing_periods.
+    Returns a frame aligned with `df` holding the expected balance and boolean 'Parse Error',
+    'Balance Mismatch' and 'Duplicate' flags.
+    """
+    keys = [key for key in (account_keys or []) if key in df.columns]
+    chain_keys = keys + ([SOURCE_FILE_COLUMN] if SOURCE_FILE_COLUMN in df.columns else [])
+
+    if chain_keys:
+        previous_balance = df.groupby(chain_keys, observed=True, sort=False)['Closing Balance'].shift()
+    else:
+        previous_balance = df['Closing Balance'].shift()
+
+    debit = df['Debit Amount']
+    credit = df['Credit Amount']
+    expected_balance = previous_balance + credit - debit
+
+    return pd.DataFrame({
+        'Expected Balance': expected_balance,
+        # A row must carry a date and exactly one of debit or credit
+        'Parse Error': df['Date'].isna() | ((debit > 0) == (credit > 0)),
+        'Balance Mismatch': previous_balance.notna() & (expected_balance != df['Closing Balance']),
+        # The same transaction appearing twice, e.g. in overlapping statement files
+        'Duplicate': df.duplicated(subset=keys + [column for column in DUPLICATE_COLUMNS if column in df.columns]),
+    }, index=df.index)
+
+
+def summarize_files(df: pd.DataFrame, flags: pd.DataFrame,
+                    account_keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Summarize reconciliation per source file: period covered, opening/closing balance and flag counts."""
+    keys = [key for key in (account_keys or []) if key in df.columns] + [SOURCE_FILE_COLUMN]
+    work = df[keys + ['Date', 'Debit Amount', 'Credit Amount', 'Closing Balance']].join(
+        flags[['Parse Error', 'Balance Mismatch', 'Duplicate']])
+
+    # Opening balance is the balance before the file's first transaction
+    work['Opening Balance'] = work['Closing Balance'] - work['Credit Amount'] + work['Debit Amount']
+
+    return work.groupby(keys, observed=True, sort=False).agg(
+        Rows=('Date', 'size'),
+        First_Date=('Date', 'min'),
+        Last_Date=('Date', 'max'),
+        Opening_Balance=('Opening Balance', 'first'),
+        Closing_Balance=('Closing Balance', 'last'),
+        Parse_Errors=('Parse Error', 'sum'),
+        Balance_Mismatches=('Balance Mismatch', 'sum'),
+        Duplicates=('Duplicate', 'sum'),
+    ).rename(columns=lambda column: column.replace('_', ' ')).reset_index()
+
+
+def find_missing_periods(summary: pd.DataFrame, account_keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Find breaks between consecutive statement files of an account.
+
+    A file whose opening balance differs from the previous file's closing balance means transactions
+    (usually a whole statement period) are missing between the two files. Overlapping files are left to
+    the duplicate check.
+    """
+    keys = [key for key in (account_keys or []) if key in summary.columns]
+    ordered = summary.sort_values(keys + ['First Date'], kind='stable')
+    grouped = ordered.groupby(keys, observed=True, sort=False) if keys else ordered
+
+    previous_file = grouped[SOURCE_FILE_COLUMN].shift()
+    previous_last_date = grouped['Last Date'].shift()
+    previous_closing = grouped['Closing Balance'].shift()
+
+    gaps = ordered.assign(**{
+        'Previous File': previous_file,
+        'Gap Start': previous_last_date,
+        'Gap End': ordered['First Date'],
+        'Missing Amount': ordered['Opening Balance'] - previous_closing,
+    })
+    gaps = gaps[previous_closing.notna() & (ordered['First Date'] >= previous_last_date) &
+                (gaps['Missing Amount'] != 0)]
+    gaps['Missing Amount'] = gaps['Missing Amount'].astype('int64')
+    return gaps[keys + ['Previous File', SOURCE_FILE_COLUMN, 'Gap Start', 'Gap End', 'Missing Amount']]
+
+
+def print_reconciliation_report(summary: pd.DataFrame, missing_periods: pd.DataFrame):
+    """Print the per-file reconciliation summary and any missing statement periods."""
+    problems = summary[(summary['Parse Errors'] > 0) | (summary['Balance Mismatches'] > 0) |
+                       (summary['Duplicates'] > 0)]
+    print(f"Reconciliation: {len(summary)} file(s), {int(summary['Rows'].sum())} rows, "
+          f"{len(problems)} file(s) with problems, {len(missing_periods)} missing period(s).")
+
+    for _, row in problems.iterrows():
+        print(f"  {row[SOURCE_FILE_COLUMN]}: {row['Parse Errors']} parse error(s), "
+              f"{row['Balance Mismatches']} balance mismatch(es), {row['Duplicates']} duplicate(s)")
+
+    for _, row in missing_periods.iterrows():
+        print(f"  Missing period between {row['Previous File']} and {row[SOURCE_FILE_COLUMN]} "
+              f"({row['Gap Start']:%d-%m-%Y} to {row['Gap End']:%d-%m-%Y}): "
+              f"₹{format_paise(row['Missing Amount'])} unaccounted for")
+
+
+def print_ingest_report(file_summaries: dict, account_keys: Optional[List[str]] = None):
+    """Print the reconciliation report for the files checked during an ingest run."""
+    if not file_summaries:
+        return
+    summary = pd.concat(file_summaries.values(), ignore_index=True)
+    print_reconciliation_report(summary, find_missing_periods(summary, account_keys))
+
+
+def check_file(df: pd.DataFrame, file_path: str, strict: bool = True,
+               seen_keys: Optional[dict] = None) -> Tuple[pd.DataFrame, pd.Series]:
+    """Reconcile one parsed statement file before it is written.
+
+    `df` holds the raw statement columns; amounts are converted to paise here so the balance check is exact.
+    `seen_keys` maps the DUPLICATE_COLUMNS of every row accepted so far in the run to the file it came from;
+    rows already read from another file, e.g. an overlapping statement, are flagged as duplicates and the
+    file's own rows are added to it.
+    Returns the one-row summary and a mask of the rows that were already read from another file.
+    Raises ReconciliationError when `strict` and the file has parse errors or balance mismatches.
+    """
+    checked = pd.DataFrame({
+        SOURCE_FILE_COLUMN: file_path,
+        'Date': pd.to_datetime(df['Date'], errors='coerce'),
+        'Narration': df['Narration'],
+        'Chq/Ref Number': df['Chq/Ref Number'],
+        'Debit Amount': to_paise(df['Debit Amount']),
+        'Credit Amount': to_paise(df['Credit Amount']),
+        'Closing Balance': to_paise(df['Closing Balance']),
+    }, index=df.index)
+
+    flags = reconcile(checked)
+
+    repeated = pd.Series(False, index=df.index)
+    if seen_keys is not None:
+        keys = list(checked[DUPLICATE_COLUMNS].astype(object).where(checked[DUPLICATE_COLUMNS].notna(), None)
+                    .itertuples(index=False, name=None))
+        # Keys remembered for this same file are its own rows, e.g. when a batch is replayed after a lost connection
+        repeated = pd.Series([seen_keys.get(key, file_path) != file_path for key in keys], index=df.index)
+        flags['Duplicate'] |= repeated
+
+    summary = summarize_files(checked, flags)
+
+    bad_rows = checked[flags['Parse Error'] | flags['Balance Mismatch']]
+    if not bad_rows.empty:
+        print(f"Reconciliation failed for {file_path}: {int(flags['Parse Error'].sum())} parse error(s), "
+              f"{int(flags['Balance Mismatch'].sum())} balance mismatch(es). First offending rows:\n",
+              bad_rows.head(REPORT_SAMPLE_ROWS))
+        if strict:
+            raise ReconciliationError(f"{file_path} does not reconcile against its closing balances")
+
+    if seen_keys is not None:
+        for key in keys:
+            seen_keys.setdefault(key, file_path)
+    return summary, repeated
+
+
+def forget_file(seen_keys: dict, file_path: str):
+    """Forget the rows remembered for a file that was rolled back, so a later file may still write them."""
+    for key in [key for key, source_file in seen_keys.items() if source_file == file_path]:
+        del seen_keys[key]
@@ -1,8 +1,10 @@
 import os
+import time
 import pandas as pd
-import mysql.connector
-import pdfplumber
-from typing import List
+from DbSchema import prepare_table
+from Reconciliation import check_file, forget_file, print_ingest_report
+from TransactionModel import COLUMN_MAPPINGS, get_generalized_narration
+from typing import List, Optional
 from datetime import datetime
 
 # Database connection details for localhost MySQL
@@ -15,37 +17,12 @@ DB_PASSWORD = 'mysql'  # Replace with your password
 # Define the SQL table name
 TABLE_NAME = 'bank_statement_replica'
 
-# Column mapping configuration for different banks
-COLUMN_MAPPINGS = {
-    'HDFC': {
-        'date': 'Date',
-        'narration': 'Narration',
-        'chq_ref_number': 'Chq/Ref Number',
-        'credit_amount': 'Credit Amount',
-        'debit_amount': 'Debit Amount',
-        'closing_balance': 'Closing Balance'
-    },
-    'ICICI': {
-        'date': 'Transaction Date',
-        'narration': 'Description',
-        'chq_ref_number': 'Reference Number',
-        'credit_amount': 'Credit',
-        'debit_amount': 'Debit',
-        'closing_balance': 'Balance'
-    },
-    'SBI': {
-        'date': 'Txn Date',
-        'narration': 'Description',
-        'chq_ref_number': 'Ref No./Cheque No.',
-        'credit_amount': 'Credit',
-        'debit_amount': 'Debit',
-        'closing_balance': 'Balance'
-    }
-}
-
 # Define default bank name
 DEFAULT_BANK_NAME = 'HDFC'
 
+# Skip files whose closing balances do not reconcile instead of writing them to MySQL
+REJECT_UNRECONCILED_FILES = True
+
 # Define default column names if not present in the file
 DEFAULT_COLUMN_NAMES = [
     'Date',
@@ -59,23 +36,27 @@ DEFAULT_COLUMN_NAMES = [
 
 
 def get_db_connection():
-    """Establish a database connection to MySQL."""
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    """Borrow a MySQL connection from the shared connection pool."""
+    # mysql-connector is only needed once the database is touched, not for dry runs
+    from DbPool import get_pool
+
+    return get_pool({
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'database': DB_NAME,
+        'user': DB_USER,
+        'password': DB_PASSWORD
+    }).get_connection()
 
 
 def insert_data(cursor, data: List[tuple]):
     """Insert data into the MySQL table."""
     insert_query = f"""
         INSERT INTO {TABLE_NAME} 
-        (date, narration, chq_ref_number, credit_amount, debit_amount, closing_balance, bank_name) 
+        (date, narration, chq_ref_number, credit_amount, debit_amount, closing_balance, bank_name,
+         generalized_narration) 
         VALUES 
-        (%s, %s, %s, %s, %s, %s, %s)
+        (%s, %s, %s, %s, %s, %s, %s, %s)
     """
     cursor.executemany(insert_query, data)
 
@@ -104,6 +85,9 @@ def clean_data(value: str) -> str:
 
 def process_pdf(file_path: str, column_names: List[str]) -> pd.DataFrame:
     """Process a PDF file in a bottom-up manner and return a DataFrame."""
+    # pdfplumber is slow to import, so only pay for it when a PDF statement is actually parsed
+    import pdfplumber
+
     rows = []
     data_started = False
     with pdfplumber.open(file_path) as pdf:
@@ -160,75 +144,164 @@ def process_pdf(file_path: str, column_names: List[str]) -> pd.DataFrame:
 
 
 
-def process_file(file_path: str, bank_name: str, cursor):
-    """Process a single file (CSV or PDF) and insert data into the MySQL table."""
+def parse_file(file_path: str, bank_name: str, file_summaries: Optional[dict] = None,
+               seen_keys: Optional[dict] = None) -> pd.DataFrame:
+    """Parse and reconcile a single file (CSV or PDF) into the rows to be inserted into the MySQL table.
+
+    Rows already read from another file of the bank in this run (see Reconciliation.check_file) are left out.
+    """
     column_mapping = COLUMN_MAPPINGS.get(bank_name, COLUMN_MAPPINGS[DEFAULT_BANK_NAME])
     file_extension = os.path.splitext(file_path)[1].lower()
 
+    if file_extension == '.pdf':
+        # Process PDF file, using only the keys from the column mapping as expected column names
+        df = process_pdf(file_path, list(column_mapping.values()))
+    elif file_extension == '.csv' or file_extension == '.txt':
+        df = pd.read_csv(file_path, delimiter=',', skiprows=1, names=DEFAULT_COLUMN_NAMES, skipinitialspace=True)
+        df = df.map(clean_data)
+        df['Date'] = df['Date'].apply(format_date)
+        df['Credit Amount'] = pd.to_numeric(df['Credit Amount'], errors='coerce').fillna(0.0)
+        df['Debit Amount'] = pd.to_numeric(df['Debit Amount'], errors='coerce').fillna(0.0)
+        df['Closing Balance'] = pd.to_numeric(df['Closing Balance'], errors='coerce').fillna(0.0)
+
+    # Reconcile the closing balance chain so bad parses never reach MySQL; PDF rows are read bottom-up
+    statement_df = df.iloc[::-1] if file_extension == '.pdf' else df
+    summary, repeated = check_file(statement_df, file_path, strict=REJECT_UNRECONCILED_FILES, seen_keys=seen_keys)
+    if file_summaries is not None:
+        file_summaries[file_path] = summary.assign(Bank=bank_name)
+
+    # Overlapping statements repeat rows that an earlier file of the run already read
+    if repeated.any():
+        print(f"Skipping {int(repeated.sum())} row(s) of {file_path} already read from another statement file.")
+        df = df[~repeated]
+
+    mapped_columns = {db_column: df_column for db_column, df_column in column_mapping.items() if
+                      df_column in df.columns}
+    filtered_df = df[list(mapped_columns.values())].rename(columns={v: k for k, v in mapped_columns.items()})
+    filtered_df['bank_name'] = bank_name
+    filtered_df['generalized_narration'] = filtered_df['narration'].map(get_generalized_narration, na_action='ignore')
+    return filtered_df
+
+
+def process_file(file_path: str, bank_name: str, cursor, file_summaries: Optional[dict] = None,
+                 seen_keys: Optional[dict] = None) -> int:
+    """Process a single file (CSV or PDF), insert data into the MySQL table and return the number of rows."""
     try:
-        if file_extension == '.pdf':
-            # Process PDF file, using only the keys from the column mapping as expected column names
-            df = process_pdf(file_path, list(column_mapping.values()))
-        elif file_extension == '.csv' or file_extension == '.txt':
-            df = pd.read_csv(file_path, delimiter=',', skiprows=1, names=DEFAULT_COLUMN_NAMES, skipinitialspace=True)
-            df = df.applymap(clean_data)
-            df['Date'] = df['Date'].apply(format_date)
-            df['Credit Amount'] = pd.to_numeric(df['Credit Amount'], errors='coerce').fillna(0.0)
-            df['Debit Amount'] = pd.to_numeric(df['Debit Amount'], errors='coerce').fillna(0.0)
-            df['Closing Balance'] = pd.to_numeric(df['Closing Balance'], errors='coerce').fillna(0.0)
-
-        mapped_columns = {db_column: df_column for db_column, df_column in column_mapping.items() if
-                          df_column in df.columns}
-        filtered_df = df[list(mapped_columns.values())].rename(columns={v: k for k, v in mapped_columns.items()})
-        filtered_df['bank_name'] = bank_name
-
-        print(f"Filtered DataFrame for {file_path}:\n", filtered_df.head())
-
-        data = [
-            (
-                row['date'],
-                row['narration'],
-                row['chq_ref_number'],
-                row['credit_amount'],
-                row['debit_amount'],
-                row['closing_balance'],
-                row['bank_name']
-            )
-            for _, row in filtered_df.iterrows()
-        ]
-
-        print(f"Data to be inserted for {file_path}:\n", data[:5])
-
-        insert_data(cursor, data)
-        print(f"Data from {file_path} inserted successfully for {bank_name}.")
-    except Exception as e:
-        print(f"Error processing file {file_path} for bank {bank_name}: {e}")
-
-
-def process_files(bank_directories: dict, insert: bool = True):
-    """Process all files for each bank in their respective directories."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+        return insert_file(file_path, bank_name, cursor, file_summaries, seen_keys)
+    except Exception:
+        # The file is rolled back, so its rows must not count as already written
+        if seen_keys is not None:
+            forget_file(seen_keys, file_path)
+        raise
+
+
+def insert_file(file_path: str, bank_name: str, cursor, file_summaries: Optional[dict] = None,
+                seen_keys: Optional[dict] = None) -> int:
+    """Parse one file and insert its new rows; called through process_file."""
+    filtered_df = parse_file(file_path, bank_name, file_summaries, seen_keys)
+
+    print(f"Filtered DataFrame for {file_path}:\n", filtered_df.head())
+
+    data = [
+        (
+            row['date'],
+            row['narration'],
+            row['chq_ref_number'],
+            row['credit_amount'],
+            row['debit_amount'],
+            row['closing_balance'],
+            row['bank_name'],
+            row['generalized_narration']
+        )
+        for _, row in filtered_df.iterrows()
+    ]
+
+    print(f"Data to be inserted for {file_path}:\n", data[:5])
+
+    insert_data(cursor, data)
+    print(f"Data from {file_path} inserted successfully for {bank_name}.")
+    return len(data)
+
+
+def process_files(bank_directories: dict, insert: bool = True, commit_policy: Optional[str] = None,
+                  commit_every: int = 1) -> int:
+    """Process all files for each bank in their respective directories and return the number of failures.
+
+    Files are written through a pooled connection; each file runs in its own savepoint so a bad file
+    is skipped without rolling back the rest of the batch, and commits follow the given commit policy
+    (DbPool.COMMIT_PER_FILES by default). Every skipped file counts as a failure, and so does an error
+    that stops the run, such as a failed connection, schema update or commit.
+    """
+    from DbPool import BatchWriter, COMMIT_PER_FILES
 
+    failures = 0
+    file_summaries = {}
+    seen_keys = {}  # Per bank: rows accepted so far in the run, see Reconciliation.check_file
     try:
-        for bank_name, directory in bank_directories.items():
-            print(f"Processing files for bank: {bank_name} in directory: {directory}")
-            for filename in os.listdir(directory):
-                if filename.endswith((".csv", ".txt", ".pdf")):
-                    file_path = os.path.join(directory, filename)
-                    print(f"Processing file: {file_path}")
-
-                    process_file(file_path, bank_name, cursor)
-
-                    if insert:
-                        conn.commit()
-                        print(f"Transaction committed for file {filename}.")
+        # Make sure the generalized narration column and dashboard indexes exist before writing
+        if insert:
+            prepare_table(get_db_connection, TABLE_NAME)
+
+        with BatchWriter(get_db_connection, commit_policy or COMMIT_PER_FILES, commit_every,
+                         insert=insert) as writer:
+            for bank_name, directory in bank_directories.items():
+                print(f"Processing files for bank: {bank_name} in directory: {directory}")
+                for filename in os.listdir(directory):
+                    if filename.endswith((".csv", ".txt", ".pdf")):
+                        file_path = os.path.join(directory, filename)
+                        print(f"Processing file: {file_path}")
+
+                        writer.write(file_path,
+                                     lambda cursor, path=file_path, bank=bank_name:
+                                     process_file(path, bank, cursor, file_summaries,
+                                                  seen_keys.setdefault(bank, {})))
+        failures = len(writer.failed)
+
+        # Report per-file reconciliation results and missing statement periods per bank
+        print_ingest_report(file_summaries, ['Bank'])
     except Exception as e:
-        conn.rollback()
         print(f"Error occurred: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        failures += 1
+    return failures
+
+
+def dry_run(bank_directories: dict) -> dict:
+    """Parse and reconcile all files without touching the database and report the parsing throughput."""
+    file_summaries = {}
+    seen_keys = {}  # Per bank: rows accepted so far in the run, see Reconciliation.check_file
+    files = rows = failed = total_bytes = 0
+
+    started = time.perf_counter()
+    for bank_name, directory in bank_directories.items():
+        for filename in os.listdir(directory):
+            if filename.endswith((".csv", ".txt", ".pdf")):
+                file_path = os.path.join(directory, filename)
+                total_bytes += os.path.getsize(file_path)
+                try:
+                    rows += len(parse_file(file_path, bank_name, file_summaries,
+                                           seen_keys.setdefault(bank_name, {})))
+                    files += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"Error processing file {file_path} for bank {bank_name}: {e}")
+    elapsed = time.perf_counter() - started
+
+    print_ingest_report(file_summaries, ['Bank'])
+
+    megabytes = total_bytes / 1024 ** 2
+    throughput = {
+        'files': files,
+        'failed': failed,
+        'rows': rows,
+        'megabytes': megabytes,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else float('inf'),
+        'megabytes_per_second': megabytes / elapsed if elapsed else float('inf'),
+    }
+    print(f"Dry run: parsed {files} file(s) ({failed} failed), {rows} rows, {megabytes:.2f} MB in {elapsed:.2f}s "
+          f"({throughput['rows_per_second']:,.0f} rows/s, {throughput['megabytes_per_second']:.2f} MB/s). "
+          f"Nothing was written to the database.")
+    return throughput
 
 
 if __name__ == "__main__":
@@ -239,4 +312,6 @@ if __name__ == "__main__":
         # Add more banks and their directories as needed
     }
 
-    process_files(bank_directories, insert=True)
+    from DbPool import COMMIT_PER_RUN
+
+    process_files(bank_directories, insert=True, commit_policy=COMMIT_PER_RUN)
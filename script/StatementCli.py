@@ -0,0 +1,172 @@
+"""Command-line entry point for ingesting statements, serving the dashboard and benchmarking the parsers.
+
+pandas, dash, pdfplumber and mysql-connector are only imported inside the command that needs them, so
+`--help` and argument errors return immediately.
+
+Examples:
+    python StatementCli.py ingest --bank HDFC=data/hdfc --bank SBI=data/sbi --commit-policy run
+    python StatementCli.py ingest --bank SBI=data/sbi --dry-run
+    python StatementCli.py serve --directory data/hdfc
+    python StatementCli.py serve --source sql --db-name finance_db
+    python StatementCli.py serve --source consolidated --bank HDFC=data/hdfc --bank SBI=data/sbi
+    python StatementCli.py bench --bank HDFC=data/hdfc --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# DB_* globals of the scripts that can be overridden from the command line or environment
+DB_SETTINGS = ('host', 'port', 'name', 'user', 'password')
+
+# Commit policies understood by DbPool.BatchWriter
+COMMIT_POLICIES = ('files', 'rows', 'run')
+
+
+def parse_bank_directory(value: str) -> tuple:
+    """Parse a BANK=DIRECTORY argument."""
+    bank_name, separator, directory = value.partition('=')
+    if not separator or not bank_name or not directory:
+        raise argparse.ArgumentTypeError(f"expected BANK=DIRECTORY, got '{value}'")
+    if not os.path.isdir(directory):
+        raise argparse.ArgumentTypeError(f"directory does not exist: {directory}")
+    return bank_name.upper(), directory
+
+
+def positive_int(value: str) -> int:
+    """Parse a count that must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {number}")
+    return number
+
+
+def add_db_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('database', 'Defaults come from BANK_DB_* environment variables, '
+                                                  'then from the values hard-coded in the scripts.')
+    group.add_argument('--db-host', default=os.environ.get('BANK_DB_HOST'))
+    group.add_argument('--db-port', type=int, default=os.environ.get('BANK_DB_PORT'))
+    group.add_argument('--db-name', default=os.environ.get('BANK_DB_NAME'))
+    group.add_argument('--db-user', default=os.environ.get('BANK_DB_USER'))
+    group.add_argument('--db-password', default=os.environ.get('BANK_DB_PASSWORD'),
+                       help='prefer BANK_DB_PASSWORD so the password does not show up in the process list')
+
+
+def apply_db_settings(module, args: argparse.Namespace):
+    """Override a script's hard-coded DB_* globals with the values given on the command line."""
+    for setting in DB_SETTINGS:
+        value = getattr(args, f'db_{setting}')
+        if value is not None:
+            setattr(module, f'DB_{setting.upper()}', value)
+
+
+def run_ingest(args: argparse.Namespace) -> int:
+    import SbiParser
+
+    bank_directories = dict(args.bank)
+    SbiParser.REJECT_UNRECONCILED_FILES = not args.allow_unreconciled
+
+    if args.dry_run:
+        throughput = SbiParser.dry_run(bank_directories)
+        return 1 if throughput['failed'] else 0
+
+    apply_db_settings(SbiParser, args)
+    failures = SbiParser.process_files(bank_directories, insert=True, commit_policy=args.commit_policy,
+                                       commit_every=args.commit_every)
+    return 1 if failures else 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    import HdfcStatementParser as dashboard
+
+    if args.directory:
+        dashboard.directory_path = args.directory
+    if args.bank:
+        dashboard.BANK_DIRECTORIES = dict(args.bank)
+    dashboard.DATA_SOURCE = args.source
+    apply_db_settings(dashboard, args)
+
+    dashboard.run_app(host=args.host, port=args.port, debug=args.debug)
+    return 0
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    import SbiParser
+    from Analytics import AnomalyEngine
+    from StatementLoader import load_transactions
+
+    bank_directories = dict(args.bank)
+    SbiParser.REJECT_UNRECONCILED_FILES = not args.allow_unreconciled
+
+    runs = [SbiParser.dry_run(bank_directories) for _ in range(args.repeat)]
+    rates = [run['rows_per_second'] for run in runs]
+    print(f"Parse throughput over {args.repeat} run(s): best {max(rates):,.0f} rows/s, "
+          f"median {statistics.median(rates):,.0f} rows/s ({runs[0]['rows']} rows per run)")
+
+    # Dashboard load and analytics only apply to the HDFC .txt statements
+    if 'HDFC' in bank_directories:
+        started = time.perf_counter()
+        df = load_transactions(bank_directories['HDFC'])
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        AnomalyEngine().update(df)
+        analytics_seconds = time.perf_counter() - started
+
+        print(f"Dashboard load: {len(df)} rows in {load_seconds:.2f}s; "
+              f"recurring/spike analytics in {analytics_seconds:.2f}s")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Parse bank statements, load them into MySQL and analyse them.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='parse statement files and write them to MySQL')
+    ingest.add_argument('--bank', type=parse_bank_directory, action='append', required=True, metavar='BANK=DIR',
+                        help='bank name and the directory holding its .csv/.txt/.pdf statements (repeatable)')
+    ingest.add_argument('--dry-run', action='store_true',
+                        help='parse and reconcile only, report throughput and never touch the database')
+    ingest.add_argument('--commit-policy', choices=COMMIT_POLICIES, default='run',
+                        help='commit per N files, per N rows or once per run (default: run)')
+    ingest.add_argument('--commit-every', type=int, default=1, metavar='N')
+    ingest.add_argument('--allow-unreconciled', action='store_true',
+                        help='write files even if their closing balances do not reconcile')
+    add_db_arguments(ingest)
+    ingest.set_defaults(func=run_ingest)
+
+    serve = subparsers.add_parser('serve', help='run the dashboard')
+    serve.add_argument('--directory', help='directory holding the HDFC .txt statements (files source)')
+    serve.add_argument('--bank', type=parse_bank_directory, action='append', metavar='BANK=DIR',
+                       help='bank name and the directory holding its statements, one sub-directory per account '
+                            '(consolidated source, repeatable)')
+    serve.add_argument('--source', choices=('files', 'sql', 'consolidated'), default='files',
+                       help='load HDFC statement files into memory, query bank_statement_replica or load every '
+                            'bank and account lazily as separate partitions (default: files)')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8050)
+    serve.add_argument('--debug', action='store_true')
+    add_db_arguments(serve)
+    serve.set_defaults(func=run_serve)
+
+    bench = subparsers.add_parser('bench', help='measure parsing, dashboard load and analytics throughput')
+    bench.add_argument('--bank', type=parse_bank_directory, action='append', required=True, metavar='BANK=DIR')
+    bench.add_argument('--repeat', type=positive_int, default=3, help='number of parse runs (default: 3)')
+    bench.add_argument('--allow-unreconciled', action='store_true',
+                       help='count files that do not reconcile as parsed instead of failed')
+    bench.set_defaults(func=run_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import pandas as pd
+from Reconciliation import find_missing_periods, print_reconciliation_report, reconcile, summarize_files
+from TransactionModel import COLUMN_MAPPINGS, compact_transactions, get_generalized_narration, print_memory_report
+
+# Bank whose export layout the dashboard was written for
+DEFAULT_BANK_NAME = 'HDFC'
+
+# Dashboard column for each database column: the HDFC headers the dashboard was written for
+STATEMENT_COLUMNS = COLUMN_MAPPINGS[DEFAULT_BANK_NAME]
+
+# Column order of HDFC exports, also assumed for exports whose header matches no known bank
+HDFC_COLUMN_NAMES = [
+    'Date', 'Narration', 'Value Date', 'Debit Amount',
+    'Credit Amount', 'Chq/Ref Number', 'Closing Balance'
+]
+
+# Statement date formats, tried in order
+DATE_FORMATS = ['%d/%m/%y', '%d/%m/%Y', '%d %b %Y', '%d-%m-%Y', '%d-%b-%Y']
+
+# Statement exports read by the dashboard
+STATEMENT_EXTENSIONS = ('.csv', '.txt')
+
+# Account name for statements kept directly in a bank's directory rather than in an account sub-directory
+DEFAULT_ACCOUNT = 'Main'
+
+
+def get_bank_columns(bank_name: str) -> dict:
+    """Return the export header used for each database field by a bank's statements."""
+    return COLUMN_MAPPINGS.get(bank_name, STATEMENT_COLUMNS)
+
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """Parse statement dates, trying each of DATE_FORMATS on the values still unparsed."""
+    parsed = pd.to_datetime(dates, format=DATE_FORMATS[0], errors='coerce')
+    for date_format in DATE_FORMATS[1:]:
+        parsed = parsed.fillna(pd.to_datetime(dates, format=date_format, errors='coerce'))
+    return parsed
+
+
+def read_statement(file_path: str, bank_name: str = DEFAULT_BANK_NAME) -> pd.DataFrame:
+    """Read one .csv/.txt statement as strings renamed to the dashboard's column names.
+
+    Raises ValueError when the header matches neither the bank's column mapping nor the HDFC column count.
+    """
+    temp_df = pd.read_csv(file_path, delimiter=',', skipinitialspace=True, dtype=str)
+    header = [column.strip() for column in temp_df.columns]
+    bank_columns = get_bank_columns(bank_name)
+
+    if set(bank_columns.values()) <= set(header):
+        # Match the bank's own headers through its column mapping
+        temp_df.columns = header
+        temp_df = temp_df[list(bank_columns.values())].rename(
+            columns={bank_column: STATEMENT_COLUMNS[field] for field, bank_column in bank_columns.items()})
+    elif len(header) == len(HDFC_COLUMN_NAMES):
+        # Fall back to the HDFC column order, as the ingest scripts do for every .csv/.txt file
+        temp_df.columns = HDFC_COLUMN_NAMES
+    else:
+        raise ValueError(f"{len(header)} columns match neither the {bank_name} headers nor the "
+                         f"{len(HDFC_COLUMN_NAMES)}-column HDFC layout: {', '.join(header)}")
+
+    # Remove leading and trailing spaces from all fields; pandas 3 reads dtype=str columns as 'str', not object
+    temp_df = temp_df.apply(lambda x: x.str.strip() if pd.api.types.is_string_dtype(x) else x)
+
+    # Convert 'Date' column to datetime format, handle parsing errors
+    temp_df['Date'] = parse_dates(temp_df['Date'])
+    return temp_df
+
+
+def discover_partitions(bank_directories: dict) -> dict:
+    """Map each (bank, account) to the directory holding its statements without reading any statement.
+
+    Sub-directories of a bank's directory are its accounts; statements kept directly in the bank's
+    directory belong to DEFAULT_ACCOUNT.
+    """
+    partitions = {}
+    for bank_name, directory in bank_directories.items():
+        entries = sorted(os.listdir(directory))
+        if any(entry.endswith(STATEMENT_EXTENSIONS) for entry in entries):
+            partitions[(bank_name, DEFAULT_ACCOUNT)] = directory
+        for entry in entries:
+            account_directory = os.path.join(directory, entry)
+            if os.path.isdir(account_directory) and any(
+                    filename.endswith(STATEMENT_EXTENSIONS) for filename in os.listdir(account_directory)):
+                partitions[(bank_name, entry)] = account_directory
+    return partitions
+
+
+def load_transactions(directory: str, bank_name: str = DEFAULT_BANK_NAME) -> pd.DataFrame:
+    """Read all .csv/.txt statements of one bank in a directory into a compact transaction frame."""
+    # Initialize an empty DataFrame to hold all data
+    df_list = []
+
+    # Loop through all statement files in the directory and read them into DataFrames
+    for filename in os.listdir(directory):
+        if filename.endswith(STATEMENT_EXTENSIONS):
+            try:
+                temp_df = read_statement(os.path.join(directory, filename), bank_name)
+            except ValueError as e:
+                print(f"Skipping {filename}: {e}")
+                continue
+
+            # Remember which statement each row came from for the reconciliation report
+            temp_df['Source File'] = filename
+
+            # Append the temporary DataFrame to the list
+            df_list.append(temp_df)
+
+    # Combine all DataFrames into a single DataFrame; a directory without readable statements gives an empty one
+    raw_df = pd.concat(df_list, ignore_index=True) if df_list else pd.DataFrame(
+        columns=list(STATEMENT_COLUMNS.values()) + ['Source File'], dtype=str)
+
+    # Compact columnar model: int64 paise amounts, categorical narrations, unused columns dropped
+    df = compact_transactions(raw_df)
+
+    # Verify the closing balance chain of every statement before anything is dropped
+    flags = reconcile(df)
+    summary = summarize_files(df, flags)
+    print_reconciliation_report(summary, find_missing_periods(summary))
+
+    # Keep only rows where exactly one of debit or credit is non-zero; the rest are reported as parse errors
+    df = df[(df['Debit Amount'] > 0) & (df['Credit Amount'] == 0) |
+            (df['Credit Amount'] > 0) & (df['Debit Amount'] == 0)].reset_index(drop=True)
+
+    # Create a new column in the DataFrame for generalized narration patterns (for filtering only)
+    # Mapping a categorical only evaluates the patterns once per distinct narration
+    df['Generalized Narration'] = df['Narration'].map(get_generalized_narration, na_action='ignore').astype('category')
+
+    print_memory_report(raw_df, df)
+    return df
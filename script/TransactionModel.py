@@ -0,0 +1,126 @@
+import re
+import pandas as pd
+
+# Amounts are held as integer paise so that sums are exact
+PAISE_PER_RUPEE = 100
+
+# Columns holding rupee amounts in the raw statement files
+AMOUNT_COLUMNS = ['Debit Amount', 'Credit Amount', 'Closing Balance']
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = ['Narration', 'Generalized Narration', 'Source File']
+
+# Columns read from the statement files but never used by the dashboard
+DROPPED_COLUMNS = ['Value Date']
+
+# Statement header used for each database column, per bank; shared by the ingest scripts and the dashboard loader
+COLUMN_MAPPINGS = {
+    'HDFC': {
+        'date': 'Date',
+        'narration': 'Narration',
+        'chq_ref_number': 'Chq/Ref Number',
+        'credit_amount': 'Credit Amount',
+        'debit_amount': 'Debit Amount',
+        'closing_balance': 'Closing Balance'
+    },
+    'ICICI': {
+        'date': 'Transaction Date',
+        'narration': 'Description',
+        'chq_ref_number': 'Reference Number',
+        'credit_amount': 'Credit',
+        'debit_amount': 'Debit',
+        'closing_balance': 'Balance'
+    },
+    'SBI': {
+        'date': 'Txn Date',
+        'narration': 'Description',
+        'chq_ref_number': 'Ref No./Cheque No.',
+        'credit_amount': 'Credit',
+        'debit_amount': 'Debit',
+        'closing_balance': 'Balance'
+    }
+}
+
+# Pattern for a rupee amount with optional sign and up to two significant decimals
+AMOUNT_PATTERN = r'^(?P<sign>-?)(?P<rupees>\d*)(?:\.(?P<paise>\d{0,2})\d*)?$'
+
+
+# Function to extract generalized narration patterns
+def get_generalized_narration(narration):
+    # Group narrations starting with 'UPI-'
+    match = re.match(r'UPI-[^@]+', narration)
+    if match:
+        return match.group()
+
+    # Group narrations starting with 'ACH D- INDIAN CLEARING CORP-' and remove the part after the last hyphen
+    match = re.match(r'(ACH D- INDIAN CLEARING CORP)-[^-]+', narration)
+    if match:
+        return match.group(1)  # Return only the general part before the last hyphen
+
+    # Add more patterns as needed here, for now return the original narration
+    return narration
+
+
+def to_paise(amounts: pd.Series) -> pd.Series:
+    """Convert rupee amount strings such as '1,234.50' to int64 paise without going through float."""
+    cleaned = amounts.astype('string').str.replace(',', '', regex=False).str.strip()
+    parts = cleaned.str.extract(AMOUNT_PATTERN)
+
+    # Unparseable or empty amounts become zero, matching the previous fillna(0) behaviour
+    rupees = pd.to_numeric(parts['rupees'], errors='coerce').fillna(0).astype('int64')
+    paise = pd.to_numeric(parts['paise'].fillna('').str.ljust(2, '0'), errors='coerce').fillna(0).astype('int64')
+    sign = 1 - 2 * parts['sign'].eq('-').fillna(False).astype('int64')
+
+    return (rupees * PAISE_PER_RUPEE + paise) * sign
+
+
+def format_paise(paise: int) -> str:
+    """Format an integer paise amount as a rupee string, e.g. 123456 -> '1,234.56'."""
+    rupees, remainder = divmod(abs(int(paise)), PAISE_PER_RUPEE)
+    sign = '-' if paise < 0 else ''
+    return f"{sign}{rupees:,}.{remainder:02d}"
+
+
+def to_rupees(paise: pd.Series) -> pd.Series:
+    """Convert paise back to rupees for plotting only; never use the result for totals."""
+    return paise / PAISE_PER_RUPEE
+
+
+def compact_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a compact copy of a transaction frame: typed dates, int64 paise and categorical narrations."""
+    compact = df.drop(columns=[column for column in DROPPED_COLUMNS if column in df.columns])
+
+    # Dates only carry day precision; seconds is the coarsest unit pandas stores
+    compact['Date'] = pd.to_datetime(compact['Date']).dt.normalize().astype('datetime64[s]')
+
+    for column in AMOUNT_COLUMNS:
+        if column in compact.columns and not pd.api.types.is_integer_dtype(compact[column]):
+            compact[column] = to_paise(compact[column])
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in compact.columns:
+            compact[column] = compact[column].astype('category')
+
+    return compact
+
+
+def memory_report(df: pd.DataFrame) -> pd.Series:
+    """Return the resident memory used by each column (and in total) in bytes."""
+    usage = df.memory_usage(deep=True, index=True)
+    usage['Total'] = usage.sum()
+    return usage
+
+
+def print_memory_report(raw_df: pd.DataFrame, compact_df: pd.DataFrame):
+    """Print a side-by-side memory report for the raw and compact transaction frames."""
+    report = pd.DataFrame({
+        'Raw (MB)': memory_report(raw_df) / 1024 ** 2,
+        'Compact (MB)': memory_report(compact_df) / 1024 ** 2
+    }).fillna(0.0)
+    report = report.reindex([column for column in report.index if column != 'Total'] + ['Total'])
+
+    compact_total = report.loc['Total', 'Compact (MB)']
+    ratio = report.loc['Total', 'Raw (MB)'] / compact_total if compact_total else float('nan')
+
+    print(f"Transaction memory report ({len(compact_df)} rows):\n", report.round(3))
+    print(f"Compact model uses {ratio:.1f}x less memory than the raw frame.")